@@ -1,29 +1,52 @@
 import string
-import numpy as np
 
 
-def set_bit(bitboard: np.ulonglong, square: int):
-	return bitboard | (np.ulonglong(1) << np.ulonglong(square))
+def set_bit(bitboard: int, square: int):
+	return bitboard | (1 << square)
 
-def get_bit(bitboard: np.ulonglong, square: int):
-	return bitboard & (np.ulonglong(1) << np.ulonglong(square))
+def get_bit(bitboard: int, square: int):
+	return bitboard & (1 << square)
 
-def pop_bit(bitboard: np.ulonglong, square: int):
-	return bitboard & ~(np.ulonglong(1) << np.ulonglong(square))
+def pop_bit(bitboard: int, square: int):
+	return bitboard & ~(1 << square)
 
-def count_bits(bitboard: np.ulonglong):
-	count = 0
-	while bitboard:
-		count += 1
-		bitboard &= bitboard - np.ulonglong(1)
-	return count
+def count_bits(bitboard: int):
+	return bitboard.bit_count()
 
 # get least significant bit
-def get_lsb1_index(bitboard: np.ulonglong):
-	return count_bits((bitboard & -bitboard) - np.ulonglong(1))
+def get_lsb1_index(bitboard: int):
+	return (bitboard & -bitboard).bit_length() - 1
+
+# slider directions as (rank, file) steps
+BISHOP_DIRECTIONS = ((1, 1), (-1, 1), (1, -1), (-1, -1))
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+def ray_attacks(square: int, occupancy: int, directions):
+	"""attacks of a slider walking its rays until the first occupied square"""
+	rank, file = divmod(square, 8)
+	attacks = 0
+	for dr, df in directions:
+		r, f = rank + dr, file + df
+		while 0 <= r <= 7 and 0 <= f <= 7:
+			attacks |= 1 << (r * 8 + f)
+			if occupancy & (1 << (r * 8 + f)):
+				break
+			r, f = r + dr, f + df
+	return attacks
+
+def relevant_mask(square: int, directions):
+	"""ray squares of a slider without the last square of each ray, a piece there never changes the attacks"""
+	rank, file = divmod(square, 8)
+	mask = 0
+	for dr, df in directions:
+		r, f = rank + dr, file + df
+		while 0 <= r + dr <= 7 and 0 <= f + df <= 7:
+			mask |= 1 << (r * 8 + f)
+			r, f = r + dr, f + df
+	return mask
 
 # debug print function
-def print_bitboard(bitboard: np.ulonglong):
+def print_bitboard(bitboard: int):
     print("\n")
     for rank in range(8):
         r = ""
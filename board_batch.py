@@ -0,0 +1,217 @@
+"""many positions at once as numpy arrays, with attack and move count kernels that work on the whole batch
+
+the python loops of the kernels run over squares and piece types, never over positions,
+so the cost per position drops as the batch grows
+"""
+import numpy as np
+
+from board_state import BoardState, SNAPSHOT_WORDS, set_fen
+from constants import *
+from generate_moves import castling_paths
+from tables import bishop_attacks, rook_attacks, bishop_masks, rook_masks, bishop_magic_numbers, rook_magic_numbers, \
+    bishop_shifts, rook_shifts, bishop_offsets, rook_offsets, pawn_attacks, knight_attacks, king_attacks
+
+ONE = np.uint64(1)
+
+# slider lookup data as numpy scalars, indexed by square
+bishop_lookup = [(np.uint64(bishop_masks[sq]), bishop_magic_numbers[sq], np.uint64(bishop_shifts[sq]), bishop_offsets[sq]) for sq in range(64)]
+rook_lookup = [(np.uint64(rook_masks[sq]), rook_magic_numbers[sq], np.uint64(rook_shifts[sq]), rook_offsets[sq]) for sq in range(64)]
+
+knight_table = np.array(knight_attacks, dtype=np.uint64)
+king_table = np.array(king_attacks, dtype=np.uint64)
+# pawn attacks with a zero row for the missing en passant square (64)
+pawn_table = np.array([pawn_attacks[color] + [EMPTY] for color in [white, black]], dtype=np.uint64)
+
+def leaper_steps(deltas):
+    """square offset of every (rank, file) step with the squares it can reach without wrapping around the board edge"""
+    steps = []
+    for dr, df in deltas:
+        arrival = sum(BIT << sq for sq in range(64) if 0 <= sq % 8 - df <= 7)
+        steps.append((dr * 8 + df, np.uint64(arrival)))
+    return steps
+
+KNIGHT_STEPS = leaper_steps(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_STEPS = leaper_steps(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+PAWN_CAPTURE_STEPS = [leaper_steps(((-1, -1), (-1, 1))), leaper_steps(((1, -1), (1, 1)))]
+
+pawn_push = [-8, 8]
+pawn_double_push_rank = [np.uint64(Rank.rank_3), np.uint64(Rank.rank_6)]
+pawn_promotion_rank = [np.uint64(Rank.rank_8), np.uint64(Rank.rank_1)]
+
+POPCOUNT_BYTES = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+def popcount(bitboards):
+    """number of set bits of every uint64 bitboard"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    # numpy 1.x has no bitwise_count, sum the counts of the eight bytes instead
+    bitboards = np.ascontiguousarray(bitboards, dtype=np.uint64)
+    return POPCOUNT_BYTES[bitboards.view(np.uint8)].reshape(*bitboards.shape, 8).sum(axis=-1)
+
+def shift(bitboards, offset):
+    """shift uint64 bitboards by a square offset, positive offsets move towards h1 and bits past the board fall off"""
+    return bitboards << np.uint64(offset) if offset > 0 else bitboards >> np.uint64(-offset)
+
+def leaper_attacks(bitboards, steps):
+    """union of the attacks of all leapers in each bitboard, computed set-wise"""
+    attacks = np.zeros_like(bitboards)
+    for offset, arrival in steps:
+        attacks |= shift(bitboards, offset) & arrival
+    return attacks
+
+def each_square(bitboards):
+    """yield every square that is set in at least one bitboard, with the indices of those bitboards"""
+    for square in range(64):
+        rows = np.flatnonzero((bitboards >> np.uint64(square)) & ONE)
+        if len(rows):
+            yield square, rows
+
+def slider_lookup(square, occupancy, is_bishop):
+    """attacks of a slider on square for every occupancy, gathered with the magic index of each"""
+    mask, magic, magic_shift, offset = bishop_lookup[square] if is_bishop else rook_lookup[square]
+    table = bishop_attacks if is_bishop else rook_attacks
+    return table[offset + (((occupancy & mask) * magic) >> magic_shift).astype(np.int64)]
+
+def slider_attacks(bitboards, occupancy, is_bishop):
+    """union of the attacks of all bishops (or rooks) in each bitboard with the matching occupancy"""
+    attacks = np.zeros_like(bitboards)
+    for square, rows in each_square(bitboards):
+        attacks[rows] |= slider_lookup(square, occupancy[rows], is_bishop)
+    return attacks
+
+def pawn_targets(pawns, empty, enemy, color):
+    """single push, double push and the two capture target sets of the pawns of one color"""
+    single_pushes = shift(pawns, pawn_push[color]) & empty
+    double_pushes = shift(single_pushes & pawn_double_push_rank[color], pawn_push[color]) & empty
+    captures = [shift(pawns, offset) & arrival & enemy for offset, arrival in PAWN_CAPTURE_STEPS[color]]
+    return single_pushes, double_pushes, captures
+
+def attack_map(pieces, occupancy, color):
+    """bitboard of every square attacked by the (n, 6) pieces of one color, occupancy is the (n,) both colors occupancy"""
+    return (
+        leaper_attacks(pieces[:, pawn], PAWN_CAPTURE_STEPS[color])
+        | leaper_attacks(pieces[:, knight], KNIGHT_STEPS)
+        | leaper_attacks(pieces[:, king], KING_STEPS)
+        | slider_attacks(pieces[:, bishop] | pieces[:, queen], occupancy, True)
+        | slider_attacks(pieces[:, rook] | pieces[:, queen], occupancy, False)
+    )
+
+def pseudo_legal_move_counts(pieces, occupancy, castle, en_passant, color):
+    """number of pseudo legal moves of positions that all have the same side to move
+
+    counts the same moves as generate_moves.generate_pseudo_legal_moves, promotions count four times
+    """
+    opp_color = color ^ 1
+    own = pieces[:, color]
+    not_own = ~occupancy[:, color]
+    all_pieces = occupancy[:, both]
+    counts = np.zeros(len(pieces), dtype=np.int64)
+
+    # pawns, promotions come in four pieces
+    promotion_rank = pawn_promotion_rank[color]
+    single_pushes, double_pushes, captures = pawn_targets(own[:, pawn], ~all_pieces, occupancy[:, opp_color], color)
+    for targets in [single_pushes] + captures:
+        counts += popcount(targets & ~promotion_rank) + 4 * popcount(targets & promotion_rank)
+    counts += popcount(double_pushes)
+    counts += popcount(pawn_table[opp_color][en_passant] & own[:, pawn])
+
+    for square, rows in each_square(own[:, knight]):
+        counts[rows] += popcount(knight_table[square] & not_own[rows])
+    for square, rows in each_square(own[:, bishop] | own[:, queen]):
+        counts[rows] += popcount(slider_lookup(square, all_pieces[rows], True) & not_own[rows])
+    for square, rows in each_square(own[:, rook] | own[:, queen]):
+        counts[rows] += popcount(slider_lookup(square, all_pieces[rows], False) & not_own[rows])
+    for square, rows in each_square(own[:, king]):
+        counts[rows] += popcount(king_table[square] & not_own[rows])
+
+    # castling, the king must not start on, pass or land on an attacked square
+    candidates = [
+        (castle & right).astype(bool) & ((all_pieces & np.uint64(empty_squares)) == 0)
+        for right, start_square, target_square, empty_squares, safe_squares in castling_paths[color]
+    ]
+    rows = np.flatnonzero(np.logical_or.reduce(candidates))
+    if len(rows):
+        danger = attack_map(pieces[rows, opp_color], all_pieces[rows], opp_color)
+        for candidate, (right, start_square, target_square, empty_squares, safe_squares) in zip(candidates, castling_paths[color]):
+            safe = (danger & np.uint64((BIT << start_square) | safe_squares)) == 0
+            counts[rows] += candidate[rows] & safe
+
+    return counts
+
+class BoardBatch:
+    """positions stored as arrays: (n, 2, 6) piece bitboards, (n, 3) occupancies and side, castle, en passant and hash vectors"""
+
+    def __init__(self, size):
+        self.pieces_bitboard = np.zeros((size, 2, 6), dtype=np.uint64)
+        self.occupancy = np.zeros((size, 3), dtype=np.uint64)
+        self.color = np.zeros(size, dtype=np.uint8)
+        self.castle = np.zeros(size, dtype=np.uint8)
+        self.en_passant_square = np.full(size, no_sq, dtype=np.uint8)
+        self.hash_key = np.zeros(size, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.color)
+
+    @classmethod
+    def from_snapshots(cls, snapshots):
+        """batch of BoardState.snapshot() words, an (n, SNAPSHOT_WORDS) array"""
+        words = np.asarray(snapshots, dtype=np.uint64).reshape(-1, SNAPSHOT_WORDS)
+        batch = cls(len(words))
+        batch.pieces_bitboard[:] = words[:, :12].reshape(-1, 2, 6)
+        batch.occupancy[:] = words[:, 12:15]
+        batch.hash_key[:] = words[:, 15]
+
+        header = words[:, 16]
+        batch.color[:] = header & ONE
+        batch.castle[:] = (header >> np.uint64(1)) & np.uint64(0xf)
+        batch.en_passant_square[:] = (header >> np.uint64(5)) & np.uint64(0x7f)
+        return batch
+
+    @classmethod
+    def from_board_states(cls, board_states):
+        return cls.from_snapshots([board_state.snapshot() for board_state in board_states])
+
+    @classmethod
+    def from_fens(cls, fens):
+        return cls.from_board_states(set_fen(fen) for fen in fens)
+
+    def snapshots(self, rows=slice(None)):
+        """the positions (or the selected rows) as an (n, SNAPSHOT_WORDS) array of BoardState.snapshot() words, without undo history"""
+        header = self.color[rows].astype(np.uint64) | self.castle[rows].astype(np.uint64) << np.uint64(1) \
+            | self.en_passant_square[rows].astype(np.uint64) << np.uint64(5)
+        return np.column_stack((self.pieces_bitboard[rows].reshape(-1, 12), self.occupancy[rows], self.hash_key[rows], header))
+
+    def board_state(self, index):
+        board_state = BoardState()
+        board_state.restore(self.snapshots([index])[0])
+        return board_state
+
+    def side_rows(self):
+        """indices of the positions with white and with black to move"""
+        return [np.flatnonzero(self.color == color) for color in [white, black]]
+
+    def attack_maps(self, color):
+        """bitboard of every square the given color attacks in each position"""
+        return attack_map(self.pieces_bitboard[:, color], self.occupancy[:, both], color)
+
+    def pawn_targets(self, color):
+        """single push, double push and capture target sets of the pawns of the given color in each position"""
+        return pawn_targets(self.pieces_bitboard[:, color, pawn], ~self.occupancy[:, both], self.occupancy[:, color ^ 1], color)
+
+    def in_check(self):
+        """True for the positions where the side to move is in check"""
+        checks = np.zeros(len(self), dtype=bool)
+        for color, rows in enumerate(self.side_rows()):
+            if len(rows):
+                danger = attack_map(self.pieces_bitboard[rows, color ^ 1], self.occupancy[rows, both], color ^ 1)
+                checks[rows] = (danger & self.pieces_bitboard[rows, color, king]) != 0
+        return checks
+
+    def pseudo_legal_move_counts(self):
+        """number of pseudo legal moves of the side to move in each position"""
+        counts = np.zeros(len(self), dtype=np.int64)
+        for color, rows in enumerate(self.side_rows()):
+            if len(rows):
+                counts[rows] = pseudo_legal_move_counts(
+                    self.pieces_bitboard[rows], self.occupancy[rows], self.castle[rows], self.en_passant_square[rows], color)
+        return counts
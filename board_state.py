@@ -1,52 +1,138 @@
-import numpy as np
-from dataclasses import dataclass, field
+from array import array
 import re
+import sys
 
-from bitboard_utils import get_bit, set_bit
+from bitboard_utils import get_bit, set_bit, get_lsb1_index
 from constants import *
+from zobrist import generate_hash_key
+
+# words of a snapshot: 12 piece bitboards, 3 occupancies, the hash key and a header word
+SNAPSHOT_WORDS = 17
 
-@dataclass()
 class BoardState:
     """Store a BoardState"""
-    color: int = field(init=False)
-
-    en_passant_square: int = field(init=False)
-
-    castle: int  = field(init=False)
-
-    pieces_bitboard: np.ndarray = field(init=False)
-    occupancy: np.ndarray = field(init=False)
+    __slots__ = ("color", "en_passant_square", "castle", "pieces_bitboard", "occupancy",
+                 "mailbox", "king_square", "hash_key", "history")
 
-    def __post_init__(self):
+    def __init__(self):
         self.color = 0
 
         self.en_passant_square = 64
 
         self.castle = 0
 
-        self.pieces_bitboard = np.zeros((2, 6), dtype=np.ulonglong)
-        self.occupancy = np.zeros(3, dtype=np.ulonglong)
-
-
-
+        self.pieces_bitboard = [[EMPTY] * 6 for _ in range(2)]
+        self.occupancy = [EMPTY] * 3
+
+        # piece + 6 * color on every square (NO_PIECE if empty) and the square of each king
+        self.mailbox = [NO_PIECE] * 64
+        self.king_square = [no_sq, no_sq]
+
+        # zobrist key of the position, see zobrist.py
+        self.hash_key = 0
+
+        # undo records of the moves made on this board, see generate_moves.make_move
+        self.history = []
+
+    def __repr__(self):
+        return (f"BoardState(color={self.color}, en_passant_square={self.en_passant_square}, "
+                f"castle={self.castle}, hash_key={self.hash_key:#018x}, moves={len(self.history)})")
+
+    def snapshot(self):
+        """pack the position into a fixed size array('Q') of SNAPSHOT_WORDS words
+
+        the header word holds the side to move (bit 0), the castling rights (bits 1-4),
+        the en passant square (bits 5-11) and the number of undo records (bits 12 and up)
+        """
+        return array("Q", (
+            *self.pieces_bitboard[white], *self.pieces_bitboard[black], *self.occupancy, self.hash_key,
+            self.color | self.castle << 1 | self.en_passant_square << 5 | len(self.history) << 12,
+        ))
+
+    def restore(self, snapshot):
+        """set the position from a snapshot, undo records made after it are dropped
+
+        the mailbox and the king squares are rebuilt from the piece bitboards. any sequence of
+        SNAPSHOT_WORDS integers works, e.g. a slice of a larger array or a numpy row
+        """
+        words = list(map(int, snapshot))
+        self.pieces_bitboard[white][:] = words[0:6]
+        self.pieces_bitboard[black][:] = words[6:12]
+        self.occupancy[:] = words[12:15]
+        self.hash_key = words[15]
+
+        header = words[16]
+        self.color = header & 1
+        self.castle = (header >> 1) & 0xf
+        self.en_passant_square = (header >> 5) & 0x7f
+        del self.history[header >> 12:]
+
+        mailbox = self.mailbox
+        mailbox[:] = [NO_PIECE] * 64
+        for color in [white, black]:
+            for piece in Pieces:
+                bitboard = self.pieces_bitboard[color][piece]
+                while bitboard:
+                    mailbox[get_lsb1_index(bitboard)] = piece + 6 * color
+                    bitboard &= bitboard - 1
+            kings = self.pieces_bitboard[color][king]
+            self.king_square[color] = get_lsb1_index(kings) if kings else no_sq
 
 ###########################################
 #           board_state utils             #
 ###########################################
 
-def print_board_state(board_state):
+def board_state_size(board_state):
+    """bytes held by a board state and its containers, the undo records included"""
+    size = sys.getsizeof(board_state)
+    for container in (board_state.pieces_bitboard[white], board_state.pieces_bitboard[black], board_state.pieces_bitboard,
+                      board_state.occupancy, board_state.mailbox, board_state.king_square, board_state.history):
+        size += sys.getsizeof(container)
+    size += sum(sys.getsizeof(bitboard) for bitboards in board_state.pieces_bitboard for bitboard in bitboards)
+    size += sum(sys.getsizeof(bitboard) for bitboard in board_state.occupancy)
+    size += sum(sys.getsizeof(record) for record in board_state.history)
+    return size
+
+def update_occupancy(board_state):
+    """rebuild the occupancy bitboards from the piece bitboards"""
+    occupancy = board_state.occupancy
+    occupancy[both] = EMPTY
+    for color in [white, black]:
+        occupancy[color] = EMPTY
+        for bitboard in board_state.pieces_bitboard[color]:
+            occupancy[color] |= bitboard
+        occupancy[both] |= occupancy[color]
+
+def occupancy_matches_pieces(board_state):
+    """debug check of the incrementally updated occupancy against a full rebuild"""
+    occupancy = list(board_state.occupancy)
+    update_occupancy(board_state)
+    matches = occupancy == board_state.occupancy
+    board_state.occupancy[:] = occupancy
+    return matches
+
+def mailbox_matches_pieces(board_state):
+    """debug check of the incrementally updated mailbox and king squares against the piece bitboards"""
+    for square in range(64):
+        code = board_state.mailbox[square]
+        for color in [white, black]:
+            for piece in Pieces:
+                if bool(get_bit(board_state.pieces_bitboard[color][piece], square)) != (code == piece + 6 * color):
+                    return False
+    return all(
+        board_state.mailbox[board_state.king_square[color]] == king + 6 * color
+        for color in [white, black] if board_state.pieces_bitboard[color][king]
+    )
+
+def board_state_string(board_state):
+    """the board, side to move, en passant square and castling rights as printable text"""
     output = "\n"
     for rank in range(8):
         output += str(8-rank) + " "
         for file in range(8):
             square = rank * 8 + file
-            for color in [white, black]:
-                if get_bit(board_state.occupancy[color], square):
-                    for piece in Pieces:
-                        if get_bit(board_state.pieces_bitboard[color][piece], square):
-                            output += " " + UNICODE_PIECE_SYMBOLS[PIECE_SYMBOLS[piece + 6*color]]
-                            break
-                    break
+            if board_state.mailbox[square] != NO_PIECE:
+                output += " " + UNICODE_PIECE_SYMBOLS[PIECE_SYMBOLS[board_state.mailbox[square]]]
             else:
                 output += ' · '
         output += "\n" 
@@ -60,8 +146,10 @@ def print_board_state(board_state):
         f"{'k' if board_state.castle & bk else ''}{'q' if board_state.castle & bq else ''} "
     )
     output += castle if castle else "-"
+    return output
 
-    print(output)
+def print_board_state(board_state):
+    print(board_state_string(board_state))
 
 def set_fen(fen) -> None:
     board_state = BoardState()
@@ -77,7 +165,7 @@ def set_fen(fen) -> None:
     try:
         turn_part = parts.pop(0)
     except IndexError:
-        board_state.color = Color.WHITE
+        board_state.color = white
     else:
         if turn_part == "w":
             board_state.color = 0
@@ -99,7 +187,7 @@ def set_fen(fen) -> None:
     try:
         ep_part = parts.pop(0)
     except IndexError:
-        board_state.en_passant_square = None
+        board_state.en_passant_square = no_sq
     else:
         try:
             board_state.en_passant_square = 64 if ep_part == "-" else square_to_coordinates.index(ep_part)
@@ -173,8 +261,14 @@ def set_fen(fen) -> None:
             board_state.occupancy[color] = set_bit(board_state.occupancy[color], square_index)
             board_state.occupancy[both] = set_bit(board_state.occupancy[both], square_index)
 
+            board_state.mailbox[square_index] = piece + 6 * color
+            if piece == king:
+                board_state.king_square[color] = square_index
+
             square_index += 1
 
+    board_state.hash_key = generate_hash_key(board_state)
+
     return board_state
 
 
@@ -1,5 +1,5 @@
+import os
 from enum import IntEnum
-import numpy as np
 
 
 BOARD_LENGTH = 8
@@ -14,7 +14,7 @@ BOARD_SQUARES = BOARD_LENGTH**2
     a2,    b2,    c2,    d2,    e2,    f2,    g2,    h2,
     a1,    b1,    c1,    d1,    e1,    f1,    g1,    h1,
     no_sq,
-) = np.arange(BOARD_SQUARES + 1, dtype=np.uint8)
+) = range(BOARD_SQUARES + 1)
 
 pawn, knight, bishop, rook, queen, king = range(6)
 
@@ -43,11 +43,22 @@ def piece_from_symbol(symbol: str):
     else:
         return piece, black
 
-white, black, both = np.arange(3, dtype=np.uint8)
+white, black, both = range(3)
 
-EMPTY = np.ulonglong(0)
-BIT = np.ulonglong(1)
-UNIVERSE = np.ulonglong(0xFFFFFFFFFFFFFFFF)
+# bitboards are plain python ints, masked to 64 bits where a shift can overflow
+EMPTY = 0
+BIT = 1
+UNIVERSE = 0xFFFFFFFFFFFFFFFF
+
+# JACE_DEBUG=1 turns on the consistency checks of the incrementally updated board state
+DEBUG = os.environ.get("JACE_DEBUG", "0") not in ("", "0")
+
+# JACE_SHARED_TABLES=1 looks the slider attacks up in the memory-mapped tables instead of private
+# python int copies, slower lookups but processes share the table pages, see tables.py
+SHARED_TABLES = os.environ.get("JACE_SHARED_TABLES", "0") not in ("", "0")
+
+# deepest ply the search and perft keep per ply state for
+MAX_PLY = 64
 
 STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 tricky_position = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1 "
@@ -60,6 +71,9 @@ wk, wq, bk, bq = (2 ** i for i in range(4))
 
 PIECE_SYMBOLS = ["P", "N", "B", "R", "Q", "K", "p", "n", "b", "r", "q", "k"]
 
+# mailbox entries are piece + 6 * color (the PIECE_SYMBOLS index), empty squares hold NO_PIECE
+NO_PIECE = 12
+
 UNICODE_PIECE_SYMBOLS = {
     "r": "♖", "R": "♜",
     "n": "♘", "N": "♞",
@@ -127,14 +141,14 @@ class File:
     G = [6, 14, 22, 30, 38, 46, 54, 62]
     H = [7, 15, 23, 31, 39, 47, 55, 63]
 
-    file_A = np.ulonglong(0x0101010101010101)
-    file_B = np.ulonglong(0x0202020202020202)
-    file_C = np.ulonglong(0x0404040404040404)
-    file_D = np.ulonglong(0x0808080808080808)
-    file_E = np.ulonglong(0x1010101010101010)
-    file_F = np.ulonglong(0x2020202020202020)
-    file_G = np.ulonglong(0x4040404040404040)
-    file_H = np.ulonglong(0x8080808080808080)
+    file_A = 0x0101010101010101
+    file_B = 0x0202020202020202
+    file_C = 0x0404040404040404
+    file_D = 0x0808080808080808
+    file_E = 0x1010101010101010
+    file_F = 0x2020202020202020
+    file_G = 0x4040404040404040
+    file_H = 0x8080808080808080
 
 
 class Rank:
@@ -147,14 +161,14 @@ class Rank:
     x7 = [8, 9, 10, 11, 12, 13, 14, 15]
     x8 = [0, 1, 2, 3, 4, 5, 6, 7]
     
-    rank_1 = np.ulonglong(0xFF00000000000000)
-    rank_2 = np.ulonglong(0x00FF000000000000)
-    rank_3 = np.ulonglong(0x0000FF0000000000)
-    rank_4 = np.ulonglong(0x000000FF00000000)
-    rank_5 = np.ulonglong(0x00000000FF000000)
-    rank_6 = np.ulonglong(0x0000000000FF0000)
-    rank_7 = np.ulonglong(0x000000000000FF00)
-    rank_8 = np.ulonglong(0x00000000000000FF)
+    rank_1 = 0xFF00000000000000
+    rank_2 = 0x00FF000000000000
+    rank_3 = 0x0000FF0000000000
+    rank_4 = 0x000000FF00000000
+    rank_5 = 0x00000000FF000000
+    rank_6 = 0x0000000000FF0000
+    rank_7 = 0x000000000000FF00
+    rank_8 = 0x00000000000000FF
 
 material_score = [100,      # white pawn score
                 300,      # white knight scrore
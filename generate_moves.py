@@ -1,11 +1,10 @@
-import numpy as np
-
 # from board import Board
-from board_state import BoardState
+from board_state import BoardState, occupancy_matches_pieces, mailbox_matches_pieces
 from move import *
 from bitboard_utils import get_bit, set_bit, pop_bit, get_lsb1_index, print_bitboard
 from constants import *
-from tables import bishop_attacks, rook_attacks, pawn_attacks, knight_attacks, king_attacks, is_square_attacked, get_attacks
+from zobrist import piece_keys, enpassant_keys, castle_keys, side_key, hash_key_matches
+from tables import bishop_attacks, rook_attacks, pawn_attacks, knight_attacks, king_attacks, is_square_attacked, attackers_to, attack_map, get_attacks, get_bishop_attacks, get_rook_attacks, squares_between, line_through
 
 """
            Binary move bits             Meaning          Hexadecimal
@@ -20,259 +19,585 @@ from tables import bishop_attacks, rook_attacks, pawn_attacks, knight_attacks, k
     1000 0000 0000 0000 0000 0000    castling flag       0x800000
 """
 
-def generate_pseudo_legal_moves(board_state):
-    """return a list of pseudo legal moves"""
-    move_list = []
+# pawn push offset, the rank a single push has to reach to allow a double push and the promotion rank, per color
+pawn_push = [-8, 8]
+pawn_double_push_rank = [Rank.rank_3, Rank.rank_6]
+pawn_promotion_rank = [Rank.rank_8, Rank.rank_1]
+
+# capture offsets towards the a and the h file, with the mask that drops targets wrapped around the board edge
+pawn_capture_offsets = [
+    [(-9, ~File.file_H), (-7, ~File.file_A)],
+    [(7, ~File.file_H), (9, ~File.file_A)],
+]
+
+def shift(bitboard, offset):
+    """shift a whole bitboard by a square offset, positive offsets move towards h1"""
+    return (bitboard << offset) & UNIVERSE if offset > 0 else bitboard >> -offset
+
+def add_pawn_targets(moves, count, targets, offset, color, flags):
+    """write the pawn moves to a set of targets into moves from count on, the start squares are the targets moved back by offset
+
+    returns the new move count
+    """
+    promotion_rank = pawn_promotion_rank[color]
+    pawn_bits = piece_templates[color][pawn] | flags
+    while targets:
+        target_square = get_lsb1_index(targets)
+        move = move_templates[target_square - offset][target_square] | pawn_bits
+        if (1 << target_square) & promotion_rank:
+            for promoted_piece in (queen, rook, bishop, knight):
+                moves[count] = move | promoted_piece << 16
+                count += 1
+        else:
+            moves[count] = move
+            count += 1
+        targets &= targets - 1
+    return count
+
+def add_pawn_moves(moves, count, pawns, color, empty, enemy, allowed=UNIVERSE):
+    """write the pushes, double pushes, captures and promotions of a set of pawns, computed for all of them at once
+
+    allowed restricts the target squares, the legal generator passes its check and pin masks. returns the new move count
+    """
+    push = pawn_push[color]
+    single_pushes = shift(pawns, push) & empty
+    double_pushes = shift(single_pushes & pawn_double_push_rank[color], push) & empty & allowed
+
+    count = add_pawn_targets(moves, count, single_pushes & allowed, push, color, 0)
+    for offset, file_mask in pawn_capture_offsets[color]:
+        count = add_pawn_targets(moves, count, shift(pawns, offset) & file_mask & enemy & allowed, offset, color, CAPTURE_FLAG)
+
+    pawn_bits = piece_templates[color][pawn] | DOUBLE_PUSH_FLAG
+    while double_pushes:
+        target_square = get_lsb1_index(double_pushes)
+        moves[count] = move_templates[target_square - 2 * push][target_square] | pawn_bits
+        count += 1
+        double_pushes &= double_pushes - 1
+    return count
+
+def add_castling_moves(board_state, moves, count):
+    """write the castle moves of the side to move into moves from count on, return the new move count
+
+    the king must not start on, pass or land on an attacked square
+    """
+    color = board_state.color
+    danger = None
+    for right, start_square, target_square, empty_squares, safe_squares in castling_paths[color]:
+        if board_state.castle & right and not board_state.occupancy[both] & empty_squares:
+            if danger is None:
+                danger = attack_map(board_state, color ^ 1)
+            if not danger & ((1 << start_square) | safe_squares):
+                moves[count] = move_templates[start_square][target_square] | piece_templates[color][king] | CASTLING_FLAG
+                count += 1
+    return count
+
+def generate_pseudo_legal_moves(board_state, move_list=None):
+    """fill move_list with the pseudo legal moves and return it, a new MoveList is used if none is passed"""
+    if move_list is None:
+        move_list = MoveList()
+    moves = move_list.moves
+    count = 0
+    color = board_state.color
+    opp_color = color ^ 1
 
     for piece in Pieces:
-        piece_bitboard = board_state.pieces_bitboard[board_state.color][piece]
-        opp_color = board_state.color ^ 1
-
-        if board_state.color == white:
-            if piece == pawn:
-                while piece_bitboard:
-                    # white pawn move
-                    start_square = get_lsb1_index(piece_bitboard)
-                    target_square = start_square - 8
-
-                    #quiet pawn move
-                    if not (target_square < a8) and not get_bit(board_state.occupancy[both], target_square):
-
-                      # promotion
-                        if a7 <= start_square <= h7:
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, queen, 0, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, rook, 0, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, bishop, 0, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, knight, 0, 0, 0, 0))
-
-                        else:
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, 0, 0, 0, 0, 0))
-
-                            if a2 <= start_square <= h2 and not get_bit(board_state.occupancy[both], target_square - 8):
-                                move_list.append(encode_move(start_square, target_square-8, piece, board_state.color, 0, 0, 1, 0, 0))
-                                
-                    attacks = pawn_attacks[white][start_square] & board_state.occupancy[black]
-
-                    while attacks:
-                        target_square = get_lsb1_index(attacks)
-                        # promotion capture
-                        if a7 <= start_square <= h7:
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, queen, 1, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, rook, 1, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, bishop, 1, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, knight, 1, 0, 0, 0))
-
-                        else:
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, 0, 1, 0, 0, 0))
-
-                        attacks = pop_bit(attacks, target_square)
-
-                    if board_state.en_passant_square != 64:
-                        en_passant_attacks = pawn_attacks[white][start_square] & np.ulonglong(1 << board_state.en_passant_square)
-
-                        if en_passant_attacks:
-                            target_en_passant = get_lsb1_index(en_passant_attacks)
-                            move_list.append(encode_move(start_square, target_en_passant, piece, board_state.color, 0, 1, 0, 1, 0))
-
-                    piece_bitboard = pop_bit(piece_bitboard, start_square)
-
-            # castle moves
-            if piece == king:
-                # kingside castle
-                if board_state.castle & wk:
-                    if not get_bit(board_state.occupancy[both], f1) and not get_bit(board_state.occupancy[both], g1):
-                        if not is_square_attacked(board_state, e1, black) and not is_square_attacked(board_state, f1, black):
-                            move_list.append(encode_move(e1, g1, piece, board_state.color, 0, 0, 0, 0, 1))
-                if board_state.castle & wq:
-                    if not get_bit(board_state.occupancy[both], d1) and not get_bit(board_state.occupancy[both], c1) and not get_bit(board_state.occupancy[both], b1):
-                        if not is_square_attacked(board_state, d1, black) and not is_square_attacked(board_state, e1, black):
-                            move_list.append(encode_move(e1, c1, piece, board_state.color, 0, 0, 0, 0, 1))
-        
-        # black pieces
-        if board_state.color == black:
-            if piece == pawn:
-                while piece_bitboard:
-                    # black pawn move
-                    start_square = get_lsb1_index(piece_bitboard)
-                    target_square = start_square + 8
-
-                    #quiet pawn move
-                    if not (target_square > h1) and not get_bit(board_state.occupancy[both], target_square):
-
-                      # promotion
-                        if a2 <= start_square <= h2:
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, queen, 0, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, rook, 0, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, bishop, 0, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, knight, 0, 0, 0, 0))
-
-                        else:
-                            # pawn push
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, 0, 0, 0, 0, 0))
-
-                            if a7 <= start_square <= h7 and not get_bit(board_state.occupancy[both], target_square + 8):
-                                move_list.append(encode_move(start_square, target_square + 8, piece, board_state.color, 0, 0, 1, 0, 0))
-
-
-                    attacks = pawn_attacks[black][start_square] & board_state.occupancy[white]
-
-                    while attacks:
-                        target_square = get_lsb1_index(attacks)
-                        # promotion
-                        if a2 <= start_square <= h2:
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, queen, 1, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, rook, 1, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, bishop, 1, 0, 0, 0))
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, knight, 1, 0, 0, 0))
-
-                        else:
-                            move_list.append(encode_move(start_square, target_square, piece, board_state.color, 0, 1, 0, 0, 0))
-
-                        attacks = pop_bit(attacks, target_square)
-
-                    if board_state.en_passant_square != 64:
-                        en_passant_attacks = pawn_attacks[black][start_square] & np.ulonglong(1 << board_state.en_passant_square)
-                        if en_passant_attacks:
-                            target_en_passant = get_lsb1_index(en_passant_attacks)
-                            move_list.append(encode_move(start_square, target_en_passant, piece, board_state.color, 0, 1, 0, 1, 0))
-                    
-                    piece_bitboard = pop_bit(piece_bitboard, start_square)
-
-            # castle moves
-            if piece == king:
-                # kingside castle
-                if board_state.castle & bk:
-                    if not get_bit(board_state.occupancy[both], f8) and not get_bit(board_state.occupancy[both], g8):
-                        if not is_square_attacked(board_state, e8, white) and not is_square_attacked(board_state, f8, white):
-                            # print("castling move: e8g8")
-                            move_list.append(encode_move(e8, g8, piece, board_state.color, 0, 0, 0, 0, 1))
-                if board_state.castle & bq:
-                    if not get_bit(board_state.occupancy[both], d8) and not get_bit(board_state.occupancy[both], c8) and not get_bit(board_state.occupancy[both], b8):
-                        if not is_square_attacked(board_state, d8, white) and not is_square_attacked(board_state, e8, white):
-                            # print("castling move: e8c8")
-                            move_list.append(encode_move(e8, c8, piece, board_state.color, 0, 0, 0, 0, 1))
-        
-        if piece in range(1, 6):
-            while piece_bitboard:
-                start_square = get_lsb1_index(piece_bitboard)
-                attacks = get_attacks(piece, start_square, board_state, board_state.color)
-
-                while attacks:
-                    target_square = get_lsb1_index(attacks)
-                    if not get_bit(board_state.occupancy[opp_color], target_square):
-                        move_list.append(encode_move(start_square, target_square, piece, board_state.color, 0, 0, 0, 0, 0))
-                    else:
-                        move_list.append(encode_move(start_square, target_square, piece, board_state.color, 0, 1, 0, 0, 0))
-
-                    attacks = pop_bit(attacks, target_square)
-                piece_bitboard = pop_bit(piece_bitboard, start_square)
+        piece_bitboard = board_state.pieces_bitboard[color][piece]
+
+        if piece == pawn:
+            count = add_pawn_moves(moves, count, piece_bitboard, color, ~board_state.occupancy[both], board_state.occupancy[opp_color])
+
+            if board_state.en_passant_square != 64:
+                # own pawns attacking the en passant square sit where an enemy pawn on it would attack
+                sources = pawn_attacks[opp_color][board_state.en_passant_square] & piece_bitboard
+                pawn_bits = piece_templates[color][pawn] | CAPTURE_FLAG | ENPASSANT_FLAG
+                while sources:
+                    start_square = get_lsb1_index(sources)
+                    moves[count] = move_templates[start_square][board_state.en_passant_square] | pawn_bits
+                    count += 1
+                    sources &= sources - 1
+            continue
+
+        piece_bits = piece_templates[color][piece]
+
+        if piece == king:
+            count = add_castling_moves(board_state, moves, count)
+
+        while piece_bitboard:
+            start_square = get_lsb1_index(piece_bitboard)
+            attacks = get_attacks(piece, start_square, board_state, color)
+            templates = move_templates[start_square]
+
+            while attacks:
+                target_square = get_lsb1_index(attacks)
+                if not get_bit(board_state.occupancy[opp_color], target_square):
+                    moves[count] = templates[target_square] | piece_bits
+                else:
+                    moves[count] = templates[target_square] | piece_bits | CAPTURE_FLAG
+                count += 1
+
+                attacks = pop_bit(attacks, target_square)
+            piece_bitboard = pop_bit(piece_bitboard, start_square)
+
+    move_list.count = count
     return move_list
 
-def make_move(board_state_orig, move, only_captures = False):
-
-    board_state = BoardState()
-    board_state.pieces_bitboard = board_state_orig.pieces_bitboard.copy()
-    board_state.occupancy = np.zeros(3, dtype=np.ulonglong)
-    board_state.color = board_state_orig.color
-    board_state.en_passant_square = board_state_orig.en_passant_square
-    board_state.castle = board_state_orig.castle
-
-
-
-    if not only_captures:
+def generate_captures(board_state, move_list=None):
+    """fill move_list with the pseudo legal captures and promotions and return it, quiet moves are never generated
+
+    a new MoveList is used if none is passed
+    """
+    if move_list is None:
+        move_list = MoveList()
+    moves = move_list.moves
+    count = 0
+    color = board_state.color
+    opp_color = color ^ 1
+    pieces = board_state.pieces_bitboard[color]
+    enemy = board_state.occupancy[opp_color]
+
+    # pawn captures and the pushes that promote
+    pawns = pieces[pawn]
+    push = pawn_push[color]
+    count = add_pawn_targets(moves, count, shift(pawns, push) & ~board_state.occupancy[both] & pawn_promotion_rank[color], push, color, 0)
+    for offset, file_mask in pawn_capture_offsets[color]:
+        count = add_pawn_targets(moves, count, shift(pawns, offset) & file_mask & enemy, offset, color, CAPTURE_FLAG)
+
+    if board_state.en_passant_square != no_sq:
+        sources = pawn_attacks[opp_color][board_state.en_passant_square] & pawns
+        pawn_bits = piece_templates[color][pawn] | CAPTURE_FLAG | ENPASSANT_FLAG
+        while sources:
+            moves[count] = move_templates[get_lsb1_index(sources)][board_state.en_passant_square] | pawn_bits
+            count += 1
+            sources &= sources - 1
+
+    for piece in range(1, 6):
+        bitboard = pieces[piece]
+        piece_bits = piece_templates[color][piece] | CAPTURE_FLAG
+        while bitboard:
+            start_square = get_lsb1_index(bitboard)
+            targets = get_attacks(piece, start_square, board_state, color) & enemy
+            templates = move_templates[start_square]
+            while targets:
+                moves[count] = templates[get_lsb1_index(targets)] | piece_bits
+                count += 1
+                targets &= targets - 1
+            bitboard &= bitboard - 1
+
+    move_list.count = count
+    return move_list
 
-        start_square = get_move_source(move)
-        target_square = get_move_target(move)
-        piece = get_move_piece(move)
-        color = int(get_move_color(move))
-        opp_color = color ^ 1
+def generate_quiets(board_state, move_list=None):
+    """fill move_list with the pseudo legal moves that neither capture nor promote and return it
+
+    together with generate_captures these are the moves of generate_pseudo_legal_moves. a new MoveList is used if none is passed
+    """
+    if move_list is None:
+        move_list = MoveList()
+    moves = move_list.moves
+    count = 0
+    color = board_state.color
+    pieces = board_state.pieces_bitboard[color]
+    empty = ~board_state.occupancy[both]
+
+    # pawn pushes short of the promotion rank and double pushes
+    push = pawn_push[color]
+    single_pushes = shift(pieces[pawn], push) & empty
+    count = add_pawn_targets(moves, count, single_pushes & ~pawn_promotion_rank[color], push, color, 0)
+
+    double_pushes = shift(single_pushes & pawn_double_push_rank[color], push) & empty
+    pawn_bits = piece_templates[color][pawn] | DOUBLE_PUSH_FLAG
+    while double_pushes:
+        target_square = get_lsb1_index(double_pushes)
+        moves[count] = move_templates[target_square - 2 * push][target_square] | pawn_bits
+        count += 1
+        double_pushes &= double_pushes - 1
+
+    count = add_castling_moves(board_state, moves, count)
+
+    for piece in range(1, 6):
+        bitboard = pieces[piece]
+        piece_bits = piece_templates[color][piece]
+        while bitboard:
+            start_square = get_lsb1_index(bitboard)
+            targets = get_attacks(piece, start_square, board_state, color) & empty
+            templates = move_templates[start_square]
+            while targets:
+                moves[count] = templates[get_lsb1_index(targets)] | piece_bits
+                count += 1
+                targets &= targets - 1
+            bitboard &= bitboard - 1
+
+    move_list.count = count
+    return move_list
 
-        promoted_piece = get_move_promote_to(move)  
-        capture_flag = get_move_capture(move)
-        double_push_flag = get_move_double(move)
-        enpassant_flag = get_move_enpassant(move)
-        castling_flag = get_move_castling(move)
+def is_pseudo_legal(board_state, move):
+    """return True if generate_pseudo_legal_moves would generate the move in this position
+
+    checks hash and killer moves, which come from other nodes, before they are played
+    """
+    color = board_state.color
+    start_square = get_move_source(move)
+    target_square = get_move_target(move)
+    piece = get_move_piece(move)
+    mailbox = board_state.mailbox
+
+    if get_move_color(move) != color or mailbox[start_square] != piece + 6 * color:
+        return False
+
+    if get_move_castling(move):
+        for right, king_source, king_target, empty_squares, safe_squares in castling_paths[color]:
+            if king_target == target_square:
+                return piece == king and start_square == king_source and bool(board_state.castle & right) \
+                    and not board_state.occupancy[both] & empty_squares \
+                    and not attack_map(board_state, color ^ 1) & ((1 << king_source) | safe_squares)
+        return False
+
+    if get_move_enpassant(move):
+        return piece == pawn and target_square == board_state.en_passant_square \
+            and bool(pawn_attacks[color][start_square] & (1 << target_square))
+
+    target_code = mailbox[target_square]
+    if get_move_capture(move):
+        if target_code == NO_PIECE or target_code // 6 == color:
+            return False
+    elif target_code != NO_PIECE:
+        return False
+
+    if piece != pawn:
+        return not get_move_promote_to(move) and not get_move_double(move) \
+            and bool(get_attacks(piece, start_square, board_state, color) & (1 << target_square))
+
+    if bool((1 << target_square) & pawn_promotion_rank[color]) != bool(get_move_promote_to(move)):
+        return False
+    if get_move_capture(move):
+        return not get_move_double(move) and bool(pawn_attacks[color][start_square] & (1 << target_square))
+    push = pawn_push[color]
+    if get_move_double(move):
+        return target_square == start_square + 2 * push and mailbox[start_square + push] == NO_PIECE \
+            and bool((1 << (start_square + push)) & pawn_double_push_rank[color])
+    return target_square == start_square + push
+
+# rook source and target square of a castling move, keyed by the king target square
+castling_rook_squares = {
+    g1: (h1, f1),
+    c1: (a1, d1),
+    g8: (h8, f8),
+    c8: (a8, d8),
+}
+
+def make_move(board_state, move, only_captures = False):
+    """make a move on the board state in place, return False (leaving the board untouched) if it is illegal
+
+    with only_captures every move but captures and promotions is refused as well
+    """
+
+    if only_captures and not get_move_capture(move) and not get_move_promote_to(move):
+        return False
+
+    play_move(board_state, move)
+
+    color = board_state.color ^ 1
+    if is_square_attacked(board_state, board_state.king_square[color], board_state.color):
+        unmake_move(board_state, move)
+        return False
+
+    return True
+
+def play_move(board_state, move):
+    """make a move known to be legal on the board state in place, without testing the own king"""
+
+    start_square = get_move_source(move)
+    target_square = get_move_target(move)
+    piece = get_move_piece(move)
+    color = int(get_move_color(move))
+    opp_color = color ^ 1
+
+    promoted_piece = get_move_promote_to(move)
+    capture_flag = get_move_capture(move)
+    double_push_flag = get_move_double(move)
+    enpassant_flag = get_move_enpassant(move)
+    castling_flag = get_move_castling(move)
+
+    pieces_bitboard = board_state.pieces_bitboard
+    occupancy = board_state.occupancy
+
+    # the occupancy is updated with the squares each side vacates and fills
+    move_bits = (1 << start_square) | (1 << target_square)
+    occupancy[color] ^= move_bits
+
+    mailbox = board_state.mailbox
+
+    # the hash key is updated with xors of everything that changes
+    hash_key = board_state.hash_key ^ side_key
+
+    captured_piece = None
+    if capture_flag and not enpassant_flag:
+        captured_piece = mailbox[target_square] - 6 * opp_color
+        # pop bits in the piece bitboard
+        pieces_bitboard[opp_color][captured_piece] = pop_bit(pieces_bitboard[opp_color][captured_piece], target_square)
+        occupancy[opp_color] ^= 1 << target_square
+        hash_key ^= piece_keys[captured_piece + 6 * opp_color][target_square]
+
+    # undo record: captured piece, castling rights, en passant square and hash key before the move
+    board_state.history.append((captured_piece, board_state.castle, board_state.en_passant_square, board_state.hash_key))
+
+    # set bits in the piece bitboard
+    pieces_bitboard[color][piece] = pop_bit(pieces_bitboard[color][piece], start_square)
+    pieces_bitboard[color][piece] = set_bit(pieces_bitboard[color][piece], target_square)
+    mailbox[start_square] = NO_PIECE
+    mailbox[target_square] = (promoted_piece or piece) + 6 * color
+    hash_key ^= piece_keys[piece + 6 * color][start_square] ^ piece_keys[mailbox[target_square]][target_square]
+
+    if piece == king:
+        board_state.king_square[color] = target_square
+
+    if promoted_piece:
+        # pop bits in the piece bitboard
+        pieces_bitboard[color][pawn] = pop_bit(pieces_bitboard[color][pawn], target_square)
 
         # set bits in the piece bitboard
-        board_state.pieces_bitboard[color][piece] = pop_bit(board_state.pieces_bitboard[color][piece], start_square)
-        board_state.pieces_bitboard[color][piece] = set_bit(board_state.pieces_bitboard[color][piece], target_square)
-
-        if capture_flag:
-            for piece in Pieces:
-                if get_bit(board_state.pieces_bitboard[opp_color][piece], target_square):
-                    # pop bits in the piece bitboard
-                    board_state.pieces_bitboard[opp_color][piece] = pop_bit(board_state.pieces_bitboard[opp_color][piece], target_square)
-                    break
+        pieces_bitboard[color][promoted_piece] = set_bit(pieces_bitboard[color][promoted_piece], target_square)
 
-        if promoted_piece:
+    if enpassant_flag: #capture en passant
+        if color==white: # black moved the pawn
             # pop bits in the piece bitboard
-            board_state.pieces_bitboard[color][pawn] = pop_bit(board_state.pieces_bitboard[color][pawn], target_square)
-
-
-            # set bits in the piece bitboard
-            board_state.pieces_bitboard[color][promoted_piece] = set_bit(board_state.pieces_bitboard[color][promoted_piece], target_square)
-
-        if enpassant_flag: #capture en passant 
-            if color==white: # black moved the pawn
-               # pop bits in the piece bitboard
-                board_state.pieces_bitboard[black][pawn] = pop_bit(board_state.pieces_bitboard[black][pawn], target_square + 8) 
-            else:
-               # pop bits in the piece bitboard
-                board_state.pieces_bitboard[white][pawn] = pop_bit(board_state.pieces_bitboard[white][pawn], target_square - 8)
-
-        board_state.en_passant_square = 64
-
-        if double_push_flag:
-            if color == white: 
-                board_state.en_passant_square = target_square + 8 
-            else:
-               # pop bits in the piece bitboard
-                board_state.en_passant_square = target_square - 8 
-
-        if castling_flag:
-            if target_square == g1:
-                board_state.pieces_bitboard[color][rook] = pop_bit(board_state.pieces_bitboard[color][rook], h1)
-
-                board_state.pieces_bitboard[color][rook] = set_bit(board_state.pieces_bitboard[color][rook], f1)
-
-            elif target_square == c1:
-                board_state.pieces_bitboard[color][rook] = pop_bit(board_state.pieces_bitboard[color][rook], a1)
-
-                board_state.pieces_bitboard[color][rook] = set_bit(board_state.pieces_bitboard[color][rook], d1)
-
-            elif target_square == g8:
-                board_state.pieces_bitboard[color][rook] = pop_bit(board_state.pieces_bitboard[color][rook], h8)
-
-                board_state.pieces_bitboard[color][rook] = set_bit(board_state.pieces_bitboard[color][rook], f8)
-
-            elif target_square == c8:
-                board_state.pieces_bitboard[color][rook] = pop_bit(board_state.pieces_bitboard[color][rook], a8)
-
-                board_state.pieces_bitboard[color][rook] = set_bit(board_state.pieces_bitboard[color][rook], d8)
-
-
-        # update castling rights
-        board_state.castle &= castling_rights[start_square]
-        board_state.castle &= castling_rights[target_square]
-
-        # update occ
-        for c in [white, black]:
-            for bb in board_state.pieces_bitboard[c]:
-                board_state.occupancy[c] |= bb
-            board_state.occupancy[both] |= board_state.occupancy[c]
-
-        board_state.color = opp_color
-
-        if not is_square_attacked(board_state, get_lsb1_index(board_state.pieces_bitboard[color][king]), opp_color):
-            return board_state
-
+            pieces_bitboard[black][pawn] = pop_bit(pieces_bitboard[black][pawn], target_square + 8)
+            occupancy[black] ^= 1 << (target_square + 8)
+            mailbox[target_square + 8] = NO_PIECE
+            hash_key ^= piece_keys[pawn + 6 * black][target_square + 8]
+        else:
+            # pop bits in the piece bitboard
+            pieces_bitboard[white][pawn] = pop_bit(pieces_bitboard[white][pawn], target_square - 8)
+            occupancy[white] ^= 1 << (target_square - 8)
+            mailbox[target_square - 8] = NO_PIECE
+            hash_key ^= piece_keys[pawn][target_square - 8]
+
+    if board_state.en_passant_square != 64:
+        hash_key ^= enpassant_keys[board_state.en_passant_square % 8]
+
+    board_state.en_passant_square = 64
+
+    if double_push_flag:
+        if color == white:
+            board_state.en_passant_square = target_square + 8
+        else:
+            board_state.en_passant_square = target_square - 8
+        hash_key ^= enpassant_keys[target_square % 8]
+
+    if castling_flag:
+        rook_source, rook_target = castling_rook_squares[target_square]
+        pieces_bitboard[color][rook] = pop_bit(pieces_bitboard[color][rook], rook_source)
+        pieces_bitboard[color][rook] = set_bit(pieces_bitboard[color][rook], rook_target)
+        occupancy[color] ^= (1 << rook_source) | (1 << rook_target)
+        mailbox[rook_source] = NO_PIECE
+        mailbox[rook_target] = rook + 6 * color
+        hash_key ^= piece_keys[rook + 6 * color][rook_source] ^ piece_keys[rook + 6 * color][rook_target]
+
+    # update castling rights
+    hash_key ^= castle_keys[board_state.castle]
+    board_state.castle &= castling_rights[start_square]
+    board_state.castle &= castling_rights[target_square]
+    hash_key ^= castle_keys[board_state.castle]
+
+    occupancy[both] = occupancy[white] | occupancy[black]
+
+    board_state.color = opp_color
+    board_state.hash_key = hash_key
+
+    if DEBUG:
+        assert occupancy_matches_pieces(board_state), f"occupancy out of sync after {get_move_uci(move)}"
+        assert mailbox_matches_pieces(board_state), f"mailbox out of sync after {get_move_uci(move)}"
+        assert hash_key_matches(board_state), f"hash key out of sync after {get_move_uci(move)}"
+
+def unmake_move(board_state, move):
+    """take back the last move made with make_move or play_move using its undo record"""
+
+    captured_piece, board_state.castle, board_state.en_passant_square, board_state.hash_key = board_state.history.pop()
+
+    start_square = get_move_source(move)
+    target_square = get_move_target(move)
+    piece = get_move_piece(move)
+    color = int(get_move_color(move))
+    opp_color = color ^ 1
+
+    promoted_piece = get_move_promote_to(move)
+
+    pieces_bitboard = board_state.pieces_bitboard
+    occupancy = board_state.occupancy
+    mailbox = board_state.mailbox
+
+    board_state.color = color
+
+    # move the piece (or the pawn it promoted from) back
+    pieces_bitboard[color][promoted_piece or piece] = pop_bit(pieces_bitboard[color][promoted_piece or piece], target_square)
+    pieces_bitboard[color][piece] = set_bit(pieces_bitboard[color][piece], start_square)
+    occupancy[color] ^= (1 << start_square) | (1 << target_square)
+    mailbox[start_square] = piece + 6 * color
+    mailbox[target_square] = NO_PIECE
+
+    if piece == king:
+        board_state.king_square[color] = start_square
+
+    if captured_piece is not None:
+        pieces_bitboard[opp_color][captured_piece] = set_bit(pieces_bitboard[opp_color][captured_piece], target_square)
+        occupancy[opp_color] ^= 1 << target_square
+        mailbox[target_square] = captured_piece + 6 * opp_color
+
+    if get_move_enpassant(move):
+        captured_square = target_square + 8 if color == white else target_square - 8
+        pieces_bitboard[opp_color][pawn] = set_bit(pieces_bitboard[opp_color][pawn], captured_square)
+        occupancy[opp_color] ^= 1 << captured_square
+        mailbox[captured_square] = pawn + 6 * opp_color
+
+    if get_move_castling(move):
+        rook_source, rook_target = castling_rook_squares[target_square]
+        pieces_bitboard[color][rook] = pop_bit(pieces_bitboard[color][rook], rook_target)
+        pieces_bitboard[color][rook] = set_bit(pieces_bitboard[color][rook], rook_source)
+        occupancy[color] ^= (1 << rook_source) | (1 << rook_target)
+        mailbox[rook_target] = NO_PIECE
+        mailbox[rook_source] = rook + 6 * color
+
+    occupancy[both] = occupancy[white] | occupancy[black]
+
+    if DEBUG:
+        assert occupancy_matches_pieces(board_state), f"occupancy out of sync after taking back {get_move_uci(move)}"
+        assert mailbox_matches_pieces(board_state), f"mailbox out of sync after taking back {get_move_uci(move)}"
+        assert hash_key_matches(board_state), f"hash key out of sync after taking back {get_move_uci(move)}"
+
+def is_legal(board_state, move):
+    """return True if a pseudo legal move does not leave the own king in check, without making it"""
+    start_square = get_move_source(move)
+    target_square = get_move_target(move)
+    color = board_state.color
+    opp_pieces = board_state.pieces_bitboard[color ^ 1]
+
+    # occupancy after the move and the enemy piece it removes
+    occupancy = (board_state.occupancy[both] ^ (1 << start_square)) | (1 << target_square)
+    captured = 1 << target_square
+    if get_move_enpassant(move):
+        captured_square = target_square + 8 if color == white else target_square - 8
+        occupancy ^= 1 << captured_square
+        captured = 1 << captured_square
+
+    king_square = target_square if get_move_piece(move) == king else board_state.king_square[color]
+    not_captured = ~captured
+
+    return not (
+        pawn_attacks[color][king_square] & opp_pieces[pawn] & not_captured
+        or knight_attacks[king_square] & opp_pieces[knight] & not_captured
+        or king_attacks[king_square] & opp_pieces[king]
+        or get_bishop_attacks(king_square, occupancy) & (opp_pieces[bishop] | opp_pieces[queen]) & not_captured
+        or get_rook_attacks(king_square, occupancy) & (opp_pieces[rook] | opp_pieces[queen]) & not_captured
+    )
+
+# castling right, king source and target square, squares that have to be empty and squares that must not be attacked
+castling_paths = [
+    [(wk, e1, g1, (1 << f1) | (1 << g1), (1 << f1) | (1 << g1)),
+     (wq, e1, c1, (1 << b1) | (1 << c1) | (1 << d1), (1 << c1) | (1 << d1))],
+    [(bk, e8, g8, (1 << f8) | (1 << g8), (1 << f8) | (1 << g8)),
+     (bq, e8, c8, (1 << b8) | (1 << c8) | (1 << d8), (1 << c8) | (1 << d8))],
+]
+
+def generate_legal_moves(board_state, move_list=None):
+    """fill move_list with the legal moves and return it, computed with check and pin masks instead of trying every move
+
+    a new MoveList is used if none is passed
+    """
+    if move_list is None:
+        move_list = MoveList()
+    moves = move_list.moves
+    count = 0
+
+    color = board_state.color
+    opp_color = color ^ 1
+    pieces = board_state.pieces_bitboard[color]
+    opp_pieces = board_state.pieces_bitboard[opp_color]
+    own = board_state.occupancy[color]
+    enemy = board_state.occupancy[opp_color]
+    occupancy = board_state.occupancy[both]
+    king_square = board_state.king_square[color]
+
+    opp_diagonal = opp_pieces[bishop] | opp_pieces[queen]
+    opp_straight = opp_pieces[rook] | opp_pieces[queen]
+
+    checkers = attackers_to(board_state, king_square, occupancy) & enemy
+
+    # the king is lifted off the board, so it can not step back along the ray of a checking slider
+    danger = attack_map(board_state, opp_color, occupancy ^ (1 << king_square))
+
+    if checkers & (checkers - 1):
+        # double check, only the king can move
+        evasion = EMPTY
+    elif checkers:
+        # capture the checker or block its ray
+        evasion = checkers | squares_between[king_square][get_lsb1_index(checkers)]
     else:
-        if get_move_capture(move):
-            return make_move(board_state, move, False)
-        return None
-
-    return None
-
-def generate_legal_moves(pos):
-    """only for debugging purposes"""
-    return [move for move in generate_pseudo_legal_moves(pos) if make_move(pos, move)]
+        evasion = UNIVERSE
+
+    # own pieces that are the only blocker between the king and an enemy slider
+    pinned = EMPTY
+    snipers = get_bishop_attacks(king_square, enemy) & opp_diagonal | get_rook_attacks(king_square, enemy) & opp_straight
+    while snipers:
+        blockers = squares_between[king_square][get_lsb1_index(snipers)] & occupancy
+        if blockers and not blockers & (blockers - 1):
+            pinned |= blockers
+        snipers &= snipers - 1
+
+    if evasion:
+        # pawn moves, pinned pawns one at a time along their pin line
+        unpinned_pawns = pieces[pawn] & ~pinned
+        count = add_pawn_moves(moves, count, unpinned_pawns, color, ~occupancy, enemy, evasion)
+
+        pinned_pawns = pieces[pawn] & pinned
+        while pinned_pawns:
+            start_square = get_lsb1_index(pinned_pawns)
+            count = add_pawn_moves(moves, count, 1 << start_square, color, ~occupancy, enemy, evasion & line_through[king_square][start_square])
+            pinned_pawns &= pinned_pawns - 1
+
+        if board_state.en_passant_square != no_sq:
+            sources = pawn_attacks[opp_color][board_state.en_passant_square] & pieces[pawn]
+            pawn_bits = piece_templates[color][pawn] | CAPTURE_FLAG | ENPASSANT_FLAG
+            while sources:
+                # removing two pawns from a rank or a diagonal can expose the king, so en passant gets the full test
+                move = move_templates[get_lsb1_index(sources)][board_state.en_passant_square] | pawn_bits
+                if is_legal(board_state, move):
+                    moves[count] = move
+                    count += 1
+                sources &= sources - 1
+
+        # knight, bishop, rook and queen moves
+        for piece in range(1, 5):
+            bitboard = pieces[piece]
+            piece_bits = piece_templates[color][piece]
+            while bitboard:
+                start_square = get_lsb1_index(bitboard)
+                targets = get_attacks(piece, start_square, board_state, color) & evasion
+                if pinned & (1 << start_square):
+                    targets &= line_through[king_square][start_square]
+                templates = move_templates[start_square]
+
+                while targets:
+                    target_square = get_lsb1_index(targets)
+                    moves[count] = templates[target_square] | piece_bits | (CAPTURE_FLAG if enemy & (1 << target_square) else 0)
+                    count += 1
+                    targets &= targets - 1
+                bitboard &= bitboard - 1
+
+    # king moves
+    targets = king_attacks[king_square] & ~own & ~danger
+    templates = move_templates[king_square]
+    king_bits = piece_templates[color][king]
+    while targets:
+        target_square = get_lsb1_index(targets)
+        moves[count] = templates[target_square] | king_bits | (CAPTURE_FLAG if enemy & (1 << target_square) else 0)
+        count += 1
+        targets &= targets - 1
+
+    if not checkers:
+        for right, start_square, target_square, empty_squares, safe_squares in castling_paths[color]:
+            if board_state.castle & right and not occupancy & empty_squares and not danger & safe_squares:
+                moves[count] = move_templates[start_square][target_square] | king_bits | CASTLING_FLAG
+                count += 1
+
+    move_list.count = count
+    return move_list
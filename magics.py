@@ -0,0 +1,119 @@
+"""search and verify the magic numbers of the slider attack tables
+
+    python magics.py            verify magic_numbers.py and replace the entries that collide
+    python magics.py --all      search all 128 magic numbers from scratch
+    python magics.py --check    only verify, exits with status 1 if an entry collides
+
+every magic number is checked against the ray walking attacks of every occupancy
+of its mask, the results are written back to magic_numbers.py
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+from bitboard_utils import count_bits, ray_attacks, relevant_mask, BISHOP_DIRECTIONS, ROOK_DIRECTIONS
+from constants import UNIVERSE, square_to_coordinates
+from magic_numbers import bishop_magic_numbers, rook_magic_numbers
+
+# the tables module validates its attack tables on import, so the search uses the ray walk
+# of bitboard_utils and does not need the magic numbers it is meant to repair
+
+MAGIC_NUMBERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "magic_numbers.py")
+
+def slider_occupancies(square, is_bishop):
+    """every occupancy of the mask of a square with the ray walking attacks for it, as uint64 arrays"""
+    directions = BISHOP_DIRECTIONS if is_bishop else ROOK_DIRECTIONS
+    mask = relevant_mask(square, directions)
+
+    # walk all subsets of the mask with the carry rippler
+    occupancies = []
+    subset = 0
+    while True:
+        occupancies.append(subset)
+        subset = (subset - mask) & mask
+        if not subset:
+            break
+
+    attacks = [ray_attacks(square, occupancy, directions) for occupancy in occupancies]
+    return np.array(occupancies, dtype=np.uint64), np.array(attacks, dtype=np.uint64)
+
+def is_magic(magic, occupancies, attacks, relevant_bits):
+    """True if every occupancy maps to an index that holds its own attacks, shared indices need equal attacks"""
+    indices = (occupancies * np.uint64(magic)) >> np.uint64(64 - relevant_bits)
+    table = np.zeros(1 << relevant_bits, dtype=np.uint64)
+    table[indices] = attacks
+    return bool(np.array_equal(table[indices], attacks))
+
+def find_magic(square, is_bishop, rng, max_tries=10_000_000):
+    """search a collision free magic number for a square with random sparse candidates"""
+    mask = relevant_mask(square, BISHOP_DIRECTIONS if is_bishop else ROOK_DIRECTIONS)
+    relevant_bits = count_bits(mask)
+    occupancies, attacks = slider_occupancies(square, is_bishop)
+
+    for _ in range(max_tries):
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        # the high bits of mask * magic form the index, too few of them set can not spread the occupancies
+        if count_bits((mask * magic) & UNIVERSE & 0xFF00000000000000) < 6:
+            continue
+        if is_magic(magic, occupancies, attacks, relevant_bits):
+            return magic
+
+    raise RuntimeError(f"no magic number found for the {'bishop' if is_bishop else 'rook'} on {square_to_coordinates[square]}")
+
+def broken_magics(magic_numbers, is_bishop):
+    """squares whose magic number maps two occupancies with different attacks to the same index"""
+    directions = BISHOP_DIRECTIONS if is_bishop else ROOK_DIRECTIONS
+    return [square for square in range(64)
+            if not is_magic(magic_numbers[square], *slider_occupancies(square, is_bishop), count_bits(relevant_mask(square, directions)))]
+
+def format_magic_numbers(name, magic_numbers):
+    rows = [", ".join(f"0x{magic:016x}" for magic in magic_numbers[i:i + 4]) for i in range(0, 64, 4)]
+    return f"{name} = [\n" + "".join(f"    {row},\n" for row in rows) + "]\n"
+
+def write_magic_numbers(rook_magics, bishop_magics, path=MAGIC_NUMBERS_PATH):
+    with open(path, "w") as f:
+        f.write('"""magic numbers of the slider attack tables, indexed by square (a8 = 0), generated and verified by magics.py"""\n\n')
+        f.write(format_magic_numbers("rook_magic_numbers", rook_magics))
+        f.write("\n")
+        f.write(format_magic_numbers("bishop_magic_numbers", bishop_magics))
+
+def main():
+    parser = argparse.ArgumentParser(description="search and verify the slider magic numbers")
+    parser.add_argument("--all", action="store_true", help="search all magic numbers from scratch")
+    parser.add_argument("--check", action="store_true", help="only verify the current magic numbers")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the candidate generator")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    magics = {False: list(rook_magic_numbers), True: list(bishop_magic_numbers)}
+    broken = False
+
+    for is_bishop in (False, True):
+        name = "bishop" if is_bishop else "rook"
+        squares = range(64) if args.all and not args.check else broken_magics(magics[is_bishop], is_bishop)
+        for square in squares:
+            if args.check:
+                print(f"{name} {square_to_coordinates[square]}: 0x{magics[is_bishop][square]:016x} collides")
+                broken = True
+                continue
+            magics[is_bishop][square] = find_magic(square, is_bishop, rng)
+            print(f"{name} {square_to_coordinates[square]}: 0x{magics[is_bishop][square]:016x}")
+
+    if args.check:
+        print("magic numbers collide" if broken else "all 128 magic numbers are collision free")
+        return 1 if broken else 0
+
+    # verify the whole set again before it replaces the module
+    for is_bishop in (False, True):
+        if broken_magics(magics[is_bishop], is_bishop):
+            raise RuntimeError("a searched magic number failed verification")
+
+    write_magic_numbers(magics[False], magics[True])
+    print(f"wrote {MAGIC_NUMBERS_PATH}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
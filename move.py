@@ -1,4 +1,8 @@
-from constants import square_to_coordinates, PIECE_SYMBOLS, UNICODE_PIECE_SYMBOLS
+from array import array
+from itertools import islice
+import numpy as np
+from constants import square_to_coordinates, algebraic_square_map, piece_from_symbol, PIECE_SYMBOLS, UNICODE_PIECE_SYMBOLS, \
+    NO_PIECE, pawn, king, white, wk, wq, bk, bq, e1, g1, c1, e8, g8, c8
 
 def encode_move(start_square, target_square, piece, color, promoted_piece, capture_flag, double_push_flag, enpassant_flag, castling_flag):
     return start_square \
@@ -11,6 +15,56 @@ def encode_move(start_square, target_square, piece, color, promoted_piece, captu
             | enpassant_flag << 22 \
             | castling_flag << 23
 
+# flag bits, or-ed into a move template instead of calling encode_move
+CAPTURE_FLAG = 0x100000
+DOUBLE_PUSH_FLAG = 0x200000
+ENPASSANT_FLAG = 0x400000
+CASTLING_FLAG = 0x800000
+
+# start and target square bits of every square pair, indexed [start][target]
+move_templates = [[start_square | target_square << 6 for target_square in range(64)] for start_square in range(64)]
+# piece and side bits, indexed [color][piece]
+piece_templates = [[piece << 12 | color << 15 for piece in range(6)] for color in range(2)]
+
+# no position has more than 218 legal moves, the pseudo legal generator stays below this as well
+MAX_MOVES = 256
+
+class MoveList:
+    """fixed size buffer of encoded moves and the number of moves in it, reused instead of building a new list"""
+    __slots__ = ("moves", "count")
+
+    def __init__(self):
+        self.moves = array("I", bytes(4 * MAX_MOVES))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return islice(self.moves, self.count)
+
+    def __getitem__(self, index):
+        if not -self.count <= index < self.count:
+            raise IndexError("move list index out of range")
+        return self.moves[index % self.count]
+
+    def __contains__(self, move):
+        return move in self.moves[:self.count]
+
+    def append(self, move):
+        self.moves[self.count] = move
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def sort(self, key=None, reverse=False):
+        """sort the moves in the buffer in place"""
+        self.moves[:self.count] = array("I", sorted(self, key=key, reverse=reverse))
+
+    def tolist(self):
+        return self.moves[:self.count].tolist()
+
 def get_move_source(move):
     return move & 0x3f
 
@@ -45,60 +99,82 @@ def get_move_uci(move):
     promoted_piece = PIECE_SYMBOLS[get_move_promote_to(move) + 6] if get_move_promote_to(move) else ""
     return source + target + promoted_piece  
 
-def uci_move_encoding(uci_move):
-    """encode uci string to move"""
+def move_array(moves):
+    """view a MoveList, an array('I') or a sequence of encoded moves as a uint32 numpy array"""
+    if isinstance(moves, MoveList):
+        return np.frombuffer(moves.moves, dtype=np.uint32, count=moves.count)
+    return np.asarray(moves, dtype=np.uint32)
+
+def decode_moves(moves):
+    """decode many moves at once, returns the source, target, piece, color, promoted piece and flag arrays
+
+    the color is the side that makes the move (white 0, black 1), the flags are the capture,
+    double push, enpassant and castling bits shifted down to bits 0-3
+    """
+    moves = move_array(moves)
+    return (
+        moves & 0x3f,
+        (moves & 0xfc0) >> 6,
+        (moves & 0x7000) >> 12,
+        (moves & 0x8000) >> 15,
+        (moves & 0xf0000) >> 16,
+        moves >> 20,
+    )
+
+# uci strings of every start square, target square and promoted piece, indexed (start * 64 + target) * 5 + promoted piece
+uci_table = np.array([
+    square_to_coordinates[start_square] + square_to_coordinates[target_square] + (PIECE_SYMBOLS[promoted_piece + 6] if promoted_piece else "")
+    for start_square in range(64)
+    for target_square in range(64)
+    for promoted_piece in range(5)
+])
+
+def moves_to_uci(moves):
+    """get the uci strings of many moves at once, as a numpy string array"""
+    moves = move_array(moves)
+    return uci_table[((moves & 0x3f) * 64 + ((moves & 0xfc0) >> 6)) * 5 + ((moves & 0xf0000) >> 16)]
+
+def uci_move_encoding(board_state, uci_move):
+    """encode a uci string to a move of the side to move in board_state, the move is not checked for legality"""
     start_square = algebraic_square_map[uci_move[0:2]]
     target_square = algebraic_square_map[uci_move[2:4]]
 
     if len(uci_move) > 4:
-        promoted_piece_str = uci_move[-1] 
-        promoted_piece, _ = piece_from_symbol(promoted_piece_str)
+        promoted_piece, _ = piece_from_symbol(uci_move[4])
     else:
         promoted_piece = 0
 
-    for p, bb in enumerate(board.pieces_bitboard[board.color]):
-        if get_bit(bb, start_square):
-            piece = p
-            break
-    color = board.color
-    opp_color = color^1
+    color = board_state.color
+    # 0 (no move) unless a piece of the side to move stands on the start square
+    if board_state.mailbox[start_square] == NO_PIECE or board_state.mailbox[start_square] // 6 != color:
+        return 0
+    piece = board_state.mailbox[start_square] - 6 * color
 
+    if piece == pawn and target_square == board_state.en_passant_square:
+        enpassant_flag = 1
+    else:
+        enpassant_flag = 0
 
-    for bb in board.pieces_bitboard[opp_color]:
-        if get_bit(bb, target_square):
-            capture_flag=1
-            break
-        else:
-            capture_flag=0
+    # an en passant capture lands on an empty square but is a capture all the same
+    capture_flag = int(board_state.mailbox[target_square] != NO_PIECE or enpassant_flag)
 
-    if piece == pawn and abs(target_square - start_square)==16:
+    if piece == pawn and abs(target_square - start_square) == 16:
         double_push_flag = 1
     else:
         double_push_flag = 0
 
-    if piece == pawn and target_square==board.en_passant_square:
-        enpassant_flag = 1
-    else:
-        enpassant_flag = 0
-
     castling_flag = 0
     if piece == king:
-        # kingside castle
-        if board.color == white:
-            if board.castle & wk and target_square==algebraic_square_map["g1"]:
-                castling_flag = 1 
-            elif board.castle & wq and target_square==algebraic_square_map["c1"]:
-                castling_flag = 1 
-            else:
-                castling_flag = 0
-
-        if board.color == black:
-            if board.castle & bk and target_square==algebraic_square_map["g8"]:
-                castling_flag = 1 
-            elif board.castle & bq and target_square==algebraic_square_map["c8"]:
-                castling_flag = 1 
-            else:
-                castling_flag = 0
+        if color == white:
+            if board_state.castle & wk and start_square == e1 and target_square == g1:
+                castling_flag = 1
+            elif board_state.castle & wq and start_square == e1 and target_square == c1:
+                castling_flag = 1
+        else:
+            if board_state.castle & bk and start_square == e8 and target_square == g8:
+                castling_flag = 1
+            elif board_state.castle & bq and start_square == e8 and target_square == c8:
+                castling_flag = 1
 
     return encode_move(start_square, target_square, piece, color, promoted_piece, capture_flag, double_push_flag, enpassant_flag, castling_flag)
 
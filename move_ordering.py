@@ -0,0 +1,180 @@
+from array import array
+
+from constants import *
+from generate_moves import generate_captures, generate_quiets, is_pseudo_legal
+from move import MAX_MOVES, MoveList, get_move_source, get_move_target, get_move_piece, get_move_capture, get_move_enpassant, \
+    get_move_promote_to
+from tables import is_square_attacked
+
+# most valuable victim, least valuable attacker: indexed [attacker][victim], a pawn taking a queen scores highest
+mvv_lva = [[100 * (victim + 1) + 5 - attacker for victim in Pieces] for attacker in Pieces]
+
+# move scores by kind, every capture outranks the killers and every killer outranks the history scores
+CAPTURE_SCORE = 10000
+KILLER_SCORES = [9000, 8000]
+# captures of a defended piece worth less than the capturing one drop below every other move
+LOSING_CAPTURE_SCORE = -10000
+# history scores are halved once one of them reaches this, so they stay below the killers
+HISTORY_LIMIT = 4000
+
+def select_best(moves, scores, index):
+    """swap the best scored move of moves[index:] (and its score) to index and return it"""
+    buffer = moves.moves
+    best = index
+    for other in range(index + 1, len(moves)):
+        if scores[other] > scores[best]:
+            best = other
+    if best != index:
+        buffer[index], buffer[best] = buffer[best], buffer[index]
+        scores[index], scores[best] = scores[best], scores[index]
+    return buffer[index]
+
+def is_losing_capture(board_state, move):
+    """a capture that gives up more than it takes if the target square is defended"""
+    piece = get_move_piece(move)
+    if get_move_enpassant(move) or get_move_promote_to(move) or piece == pawn:
+        return False
+    target_square = get_move_target(move)
+    victim = board_state.mailbox[target_square] % 6
+    return material_score[piece] > material_score[victim] \
+        and is_square_attacked(board_state, target_square, board_state.color ^ 1)
+
+class MoveOrdering:
+    """scores the moves of a node so the likely best ones are searched first
+
+    captures by MVV-LVA (promotions count as capturing the promoted piece), two killer moves
+    per ply and a history score per [color][from][to] for the remaining quiet moves. scores
+    are kept in buffers per ply next to the move buffers and the moves are picked from the
+    buffers in place, best first. staged_moves generates the moves of a node lazily in that order.
+    """
+
+    def __init__(self):
+        self.score_buffers = [array("i", bytes(4 * MAX_MOVES)) for ply in range(MAX_PLY)]
+        # move and score buffers of the capture and quiet stages of staged_moves
+        self.capture_buffers = [MoveList() for ply in range(MAX_PLY)]
+        self.capture_scores = [array("i", bytes(4 * MAX_MOVES)) for ply in range(MAX_PLY)]
+        self.quiet_buffers = [MoveList() for ply in range(MAX_PLY)]
+        self.quiet_scores = [array("i", bytes(4 * MAX_MOVES)) for ply in range(MAX_PLY)]
+        self.killers = [[0] * MAX_PLY for _ in range(2)]
+        self.history = [[[0] * 64 for _ in range(64)] for _ in range(2)]
+
+        # beta cutoffs and how many of them came from the first move searched
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """forget the killers, keep half of the history and reset the statistics"""
+        for killers in self.killers:
+            killers[:] = [0] * MAX_PLY
+        for color_history in self.history:
+            for from_history in color_history:
+                from_history[:] = [score >> 1 for score in from_history]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def score_move(self, board_state, move, ply):
+        promoted_piece = get_move_promote_to(move)
+        if get_move_capture(move):
+            victim = pawn if get_move_enpassant(move) else board_state.mailbox[get_move_target(move)] % 6
+            score = CAPTURE_SCORE + mvv_lva[get_move_piece(move)][victim]
+        elif promoted_piece:
+            score = CAPTURE_SCORE
+        elif move == self.killers[0][ply]:
+            return KILLER_SCORES[0]
+        elif move == self.killers[1][ply]:
+            return KILLER_SCORES[1]
+        else:
+            return self.history[board_state.color][get_move_source(move)][get_move_target(move)]
+        if promoted_piece:
+            score += mvv_lva[pawn][promoted_piece]
+        return score
+
+    def score_moves(self, board_state, moves, ply):
+        """score every move of the list into the score buffer of the ply"""
+        scores = self.score_buffers[ply]
+        buffer = moves.moves
+        for index in range(len(moves)):
+            scores[index] = self.score_move(board_state, buffer[index], ply)
+
+    def pick_move(self, moves, ply, index):
+        """swap the best scored move of moves[index:] to index and return it"""
+        return select_best(moves, self.score_buffers[ply], index)
+
+    def staged_moves(self, board_state, ply, hash_move=0):
+        """yield the pseudo legal moves of a node stage by stage, a stage is only generated once the previous one is used up
+
+        hash move, winning captures, killers, quiet moves, losing captures. a node that cuts off
+        on the hash move or a capture never generates its quiet moves
+        """
+        if hash_move and is_pseudo_legal(board_state, hash_move):
+            yield hash_move
+
+        captures = generate_captures(board_state, self.capture_buffers[ply])
+        capture_scores = self.capture_scores[ply]
+        buffer = captures.moves
+        for index in range(len(captures)):
+            move = buffer[index]
+            capture_scores[index] = self.score_move(board_state, move, ply)
+            if get_move_capture(move) and is_losing_capture(board_state, move):
+                capture_scores[index] += LOSING_CAPTURE_SCORE - CAPTURE_SCORE
+
+        index = 0
+        while index < len(captures):
+            move = select_best(captures, capture_scores, index)
+            if capture_scores[index] < 0:
+                break
+            index += 1
+            if move != hash_move:
+                yield move
+
+        killers = (self.killers[0][ply], self.killers[1][ply])
+        for killer in killers:
+            if killer and killer != hash_move and is_pseudo_legal(board_state, killer):
+                yield killer
+
+        quiets = generate_quiets(board_state, self.quiet_buffers[ply])
+        quiet_scores = self.quiet_scores[ply]
+        history = self.history[board_state.color]
+        buffer = quiets.moves
+        for quiet_index in range(len(quiets)):
+            move = buffer[quiet_index]
+            quiet_scores[quiet_index] = history[get_move_source(move)][get_move_target(move)]
+
+        for quiet_index in range(len(quiets)):
+            move = select_best(quiets, quiet_scores, quiet_index)
+            if move != hash_move and move not in killers:
+                yield move
+
+        while index < len(captures):
+            move = select_best(captures, capture_scores, index)
+            index += 1
+            if move != hash_move:
+                yield move
+
+    def update_cutoff(self, board_state, move, ply, depth, moves_searched):
+        """record a beta cutoff, quiet moves become killers and gain history"""
+        self.cutoffs += 1
+        if moves_searched == 1:
+            self.first_move_cutoffs += 1
+
+        if get_move_capture(move) or get_move_promote_to(move):
+            return
+        if move != self.killers[0][ply]:
+            self.killers[1][ply] = self.killers[0][ply]
+            self.killers[0][ply] = move
+        self.update_history(board_state.color, move, depth)
+
+    def update_history(self, color, move, depth):
+        from_history = self.history[color][get_move_source(move)]
+        target_square = get_move_target(move)
+        from_history[target_square] += depth * depth
+        if from_history[target_square] >= HISTORY_LIMIT:
+            for color_history in self.history:
+                for squares in color_history:
+                    squares[:] = [score >> 1 for score in squares]
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def print_stats(self):
+        print(f"cutoffs: {self.cutoffs}  first move cutoffs: {self.first_move_cutoffs} ({self.first_move_cutoff_rate():.1%})")
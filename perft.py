@@ -1,21 +1,167 @@
-from move import encode_move, get_move_uci
-from generate_moves import generate_pseudo_legal_moves, make_move, generate_legal_moves
+from move import encode_move, get_move_uci, moves_to_uci, MoveList
+from generate_moves import generate_pseudo_legal_moves, make_move, play_move, unmake_move, generate_legal_moves
 from board_state import BoardState
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
 import chess
+import os
 import sys
+import time
+from constants import MAX_PLY, SHARED_TABLES
 
+# one move buffer per ply, refilled at every node instead of building new lists
+move_buffers = [MoveList() for ply in range(MAX_PLY)]
 
-def perft(board_state, depth):
+def perft(board_state, depth, ply=0):
 	if depth == 0:
 		return 1
-	moves = generate_pseudo_legal_moves(board_state)
+	moves = generate_legal_moves(board_state, move_buffers[ply])
+	if depth == 1:
+		# bulk counting, the leaves are never made
+		return len(moves)
 	nodes = 0
 	for move in moves:
-		new_board_state = make_move(board_state, move)
-		if new_board_state is not None:
-			nodes += perft(new_board_state, depth - 1)
+		play_move(board_state, move)
+		nodes += perft(board_state, depth - 1, ply + 1)
+		unmake_move(board_state, move)
 	return nodes
 
+class PerftTable:
+	"""fixed size (hash key, depth) -> node count cache for perft
+
+	the table is a power of two number of buckets with two slots each, held in
+	numpy arrays sized from a memory budget. the first slot of a bucket keeps the
+	deepest (most expensive) subtree, the second slot always takes the newest one.
+	"""
+	# bytes per slot: key, node count and depth
+	SLOT_BYTES = 8 + 8 + 1
+
+	def __init__(self, hash_mb=16):
+		slots = max(2, int(hash_mb * 1024 * 1024) // self.SLOT_BYTES)
+		buckets = 1 << ((slots // 2).bit_length() - 1)
+		self.mask = buckets - 1
+
+		self.keys = np.zeros(2 * buckets, dtype=np.uint64)
+		self.nodes = np.zeros(2 * buckets, dtype=np.uint64)
+		# depth 0 marks an empty slot, leaves are never stored
+		self.depths = np.zeros(2 * buckets, dtype=np.uint8)
+
+		self.probes = 0
+		self.hits = 0
+		self.stores = 0
+		self.overwrites = 0
+
+	def probe(self, hash_key, depth):
+		"""return the stored node count of the position at this depth, or -1"""
+		self.probes += 1
+		slot = (hash_key & self.mask) << 1
+		for index in (slot, slot + 1):
+			if self.depths.item(index) == depth and self.keys.item(index) == hash_key:
+				self.hits += 1
+				return self.nodes.item(index)
+		return -1
+
+	def store(self, hash_key, depth, nodes):
+		slot = (hash_key & self.mask) << 1
+		index = slot if depth >= self.depths.item(slot) else slot + 1
+
+		self.stores += 1
+		if self.depths.item(index):
+			self.overwrites += 1
+
+		self.keys[index] = hash_key
+		self.nodes[index] = nodes
+		self.depths[index] = depth
+
+	def hit_rate(self):
+		return self.hits / self.probes if self.probes else 0.0
+
+	def filled(self):
+		return np.count_nonzero(self.depths) / len(self.depths)
+
+	def print_stats(self):
+		print(f"probes: {self.probes}  hits: {self.hits} ({self.hit_rate():.1%})  "
+			  f"stores: {self.stores}  overwrites: {self.overwrites}  filled: {self.filled():.1%}")
+
+def perft_hashed(board_state, depth, table, ply=0):
+	"""perft that looks up and stores subtree node counts in a PerftTable"""
+	if depth == 0:
+		return 1
+	nodes = table.probe(board_state.hash_key, depth)
+	if nodes >= 0:
+		return nodes
+	moves = generate_legal_moves(board_state, move_buffers[ply])
+	if depth == 1:
+		nodes = len(moves)
+		table.store(board_state.hash_key, depth, nodes)
+		return nodes
+	nodes = 0
+	for move in moves:
+		play_move(board_state, move)
+		nodes += perft_hashed(board_state, depth - 1, table, ply + 1)
+		unmake_move(board_state, move)
+	table.store(board_state.hash_key, depth, nodes)
+	return nodes
+
+def perft_subtree(board_state, moves, depth):
+	"""play the moves leading to a subtree and count its nodes (runs in a worker process)"""
+	for move in moves:
+		play_move(board_state, move)
+	return perft(board_state, depth)
+
+def perft_parallel(board_state, depth, workers=None, print_info=True, shared_tables=None):
+	"""perft with the subtrees of the root moves counted in worker processes
+
+	when the root has only a few moves per worker every reply becomes its own task,
+	so one big subtree can not keep the other workers waiting. the workers import
+	tables, which memory-maps the cached slider tables instead of rebuilding them.
+	shared_tables picks the slider lookup tables of the workers (see tables.slider_lookup_tables),
+	None keeps the ones of this process. returns the node count of every root move
+	"""
+	workers = workers or os.cpu_count()
+	start = time.time()
+
+	root_moves = generate_legal_moves(board_state)
+	split_replies = depth >= 3 and len(root_moves) < 4 * workers
+
+	tasks = []
+	for move in root_moves:
+		if split_replies:
+			play_move(board_state, move)
+			for reply in generate_legal_moves(board_state):
+				tasks.append((move, [move, reply], depth - 2))
+			unmake_move(board_state, move)
+		else:
+			tasks.append((move, [move], depth - 1))
+
+	# forked workers inherit the lookup tables of this process, spawned ones import tables
+	# again and pick theirs from JACE_SHARED_TABLES
+	spawn = shared_tables is not None and shared_tables != SHARED_TABLES
+	previous_setting = os.environ.get("JACE_SHARED_TABLES")
+	if spawn:
+		os.environ["JACE_SHARED_TABLES"] = "1" if shared_tables else "0"
+
+	divide = {move: 0 for move in root_moves}
+	try:
+		with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn") if spawn else None) as executor:
+			futures = [(move, executor.submit(perft_subtree, board_state, moves, remaining)) for move, moves, remaining in tasks]
+			for move, future in futures:
+				divide[move] += future.result()
+	finally:
+		if spawn and previous_setting is None:
+			del os.environ["JACE_SHARED_TABLES"]
+		elif spawn:
+			os.environ["JACE_SHARED_TABLES"] = previous_setting
+
+	elapsed = time.time() - start
+	if print_info:
+		nodes = sum(divide.values())
+		for uci, count in zip(moves_to_uci(list(divide)), divide.values()):
+			print(f"move: {uci}     nodes: {count}")
+		print(f"nodes: {nodes}  time: {elapsed:.2f}s  nps: {nodes / elapsed:.0f}  workers: {workers}  tasks: {len(tasks)}")
+	return divide
+
 def debug_perft(board, depth, b, print_info=False):
     """perft test with python-chess in parallel to narrow down the bugs"""
     if depth == 0:
@@ -23,7 +169,7 @@ def debug_perft(board, depth, b, print_info=False):
     count = 0
     moves = generate_legal_moves(board)
     PC_moves = set(m.uci() for m in b.legal_moves)
-    JACE_moves = set(get_move_uci(m) for m in moves)
+    JACE_moves = set(moves_to_uci(moves).tolist())
     if PC_moves != JACE_moves:
         print("Moves played:", [m.uci() for m in b.move_stack])
         print("In this position:", b.fen())
@@ -39,7 +185,9 @@ def debug_perft(board, depth, b, print_info=False):
 
     for m in moves:
         b.push_uci(get_move_uci(m))
-        c = debug_perft(make_move(board, m), depth - 1, b)
+        play_move(board, m)
+        c = debug_perft(board, depth - 1, b)
+        unmake_move(board, m)
         count += c
         b.pop()
         if print_info:
@@ -0,0 +1,288 @@
+from collections import namedtuple
+import time
+
+from bitboard_utils import get_lsb1_index
+from constants import *
+from generate_moves import generate_captures, is_pseudo_legal, make_move, unmake_move
+from move import MoveList, get_move_uci, get_move_target, get_move_enpassant, get_move_promote_to
+from move_ordering import MoveOrdering
+from tables import is_square_attacked
+from transposition import TranspositionTable, EXACT, UPPER_BOUND, LOWER_BOUND, get_entry_move, get_entry_score, \
+    get_entry_depth, get_entry_bound
+
+# score bounds, mate scores are MATE_VALUE minus the ply of the mate so shorter mates score higher
+INFINITY = 50000
+MATE_VALUE = 49000
+MATE_SCORE = 48000
+
+# quiescence skips captures that can not bring the score back to alpha even with this much to spare
+DELTA_MARGIN = 200
+
+def score_to_table(score, ply):
+    """mate scores are stored as the distance from the node, not from the root"""
+    if score > MATE_SCORE:
+        return score + ply
+    if score < -MATE_SCORE:
+        return score - ply
+    return score
+
+def score_from_table(score, ply):
+    if score > MATE_SCORE:
+        return score - ply
+    if score < -MATE_SCORE:
+        return score + ply
+    return score
+
+# positional score of every piece type from white's point of view, the queen has no table
+positional_scores = [pawn_score, knight_score, bishop_score, rook_score, None, king_score]
+
+def init_piece_square_scores():
+    """material plus positional score of every piece + 6 * color on every square, black scores are negative"""
+    scores = []
+    for color in [white, black]:
+        for piece in Pieces:
+            table = positional_scores[piece]
+            material = material_score[piece + 6 * color]
+            if table is None:
+                scores.append([material] * 64)
+            elif color == white:
+                scores.append([material + table[square] for square in range(64)])
+            else:
+                scores.append([material - table[mirror_score[square]] for square in range(64)])
+    return scores
+
+piece_square_scores = init_piece_square_scores()
+
+def evaluate(board_state):
+    """static evaluation in centipawns from the point of view of the side to move"""
+    score = 0
+    for color in [white, black]:
+        for piece in Pieces:
+            scores = piece_square_scores[piece + 6 * color]
+            bitboard = board_state.pieces_bitboard[color][piece]
+            while bitboard:
+                score += scores[get_lsb1_index(bitboard)]
+                bitboard &= bitboard - 1
+    return score if board_state.color == white else -score
+
+# statistics of one finished iterative deepening iteration, the rates count from the start of the search
+IterationInfo = namedtuple("IterationInfo", ["depth", "score", "nodes", "time", "nps", "pv", "hash_hit_rate", "hash_cutoff_rate",
+                                             "hash_full", "first_move_cutoff_rate"])
+
+def print_iteration(info):
+    print(f"info depth {info.depth} score cp {info.score} nodes {info.nodes} time {int(info.time * 1000)} "
+          f"nps {info.nps} pv {' '.join(get_move_uci(move) for move in info.pv)}")
+    print(f"info string hash hits {info.hash_hit_rate:.1%} hash cutoffs {info.hash_cutoff_rate:.1%} hash full {info.hash_full:.1%} "
+          f"first move cutoffs {info.first_move_cutoff_rate:.1%}")
+
+class Search:
+    """negamax alpha-beta search with iterative deepening and a principal variation table
+
+    a search stops at the depth, node or time limit, or when stop() is called from another thread.
+    the result of an unfinished iteration is thrown away, the best move of the last finished one is kept
+    """
+
+    def __init__(self, hash_mb=16):
+        self.transposition_table = TranspositionTable(hash_mb)
+        self.ordering = MoveOrdering()
+
+        # triangular principal variation table, pv_table[ply] holds the line from ply on
+        self.pv_table = [[0] * MAX_PLY for _ in range(MAX_PLY)]
+        self.pv_length = [0] * MAX_PLY
+        self.move_buffers = [MoveList() for ply in range(MAX_PLY)]
+
+        self.board_state = None
+        self.nodes = 0
+        self.stopped = False
+        # principal variation of the previous iteration, followed first by the next one
+        self.previous_pv = []
+        self.follow_pv = False
+        self.start_time = 0.0
+        self.deadline = None
+        self.node_limit = None
+        self.iterations = []
+
+    def stop(self):
+        self.stopped = True
+
+    def check_limits(self):
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            self.stopped = True
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.stopped = True
+
+    def principal_variation(self):
+        return self.pv_table[0][:self.pv_length[0]]
+
+    def quiescence(self, alpha, beta, ply):
+        """search only captures and promotions until the position is quiet, so leaves are not evaluated mid exchange"""
+        board_state = self.board_state
+
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self.check_limits()
+
+        # the side to move can stand pat, it is not forced to capture
+        stand_pat = evaluate(board_state)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return beta if stand_pat >= beta else stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        moves = generate_captures(board_state, self.move_buffers[ply])
+        ordering = self.ordering
+        ordering.score_moves(board_state, moves, ply)
+
+        for index in range(len(moves)):
+            move = ordering.pick_move(moves, ply, index)
+
+            # delta pruning, winning the captured piece would still leave the score below alpha
+            if not get_move_promote_to(move):
+                victim = pawn if get_move_enpassant(move) else board_state.mailbox[get_move_target(move)] % 6
+                if stand_pat + material_score[victim] + DELTA_MARGIN <= alpha:
+                    continue
+
+            if not make_move(board_state, move, only_captures=True):
+                continue
+            score = -self.quiescence(-beta, -alpha, ply + 1)
+            unmake_move(board_state, move)
+
+            if self.stopped:
+                return 0
+
+            if score > alpha:
+                alpha = score
+                if score >= beta:
+                    return beta
+
+        return alpha
+
+    def negamax(self, alpha, beta, depth, ply):
+        self.pv_length[ply] = ply
+        board_state = self.board_state
+
+        if depth == 0:
+            return self.quiescence(alpha, beta, ply)
+
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self.check_limits()
+
+        if ply >= MAX_PLY - 1:
+            return evaluate(board_state)
+
+        # a deep enough stored score of this position settles the node, the root always searches for its move
+        table = self.transposition_table
+        entry = table.probe(board_state.hash_key)
+        hash_move = get_entry_move(entry)
+        if entry and ply and get_entry_depth(entry) >= depth:
+            score = score_from_table(get_entry_score(entry), ply)
+            bound = get_entry_bound(entry)
+            if bound == EXACT:
+                table.cutoffs += 1
+                return score
+            if bound == UPPER_BOUND and score <= alpha:
+                table.cutoffs += 1
+                return alpha
+            if bound == LOWER_BOUND and score >= beta:
+                table.cutoffs += 1
+                return beta
+
+        color = board_state.color
+        in_check = is_square_attacked(board_state, board_state.king_square[color], color ^ 1)
+        # the entry is stored with the depth the node was probed with, storing the extended depth would
+        # let it settle a later probe that is itself extended one ply deeper
+        table_depth = depth
+        # search checks one ply deeper so they are never cut off by the horizon
+        if in_check:
+            depth += 1
+
+        # the previous principal variation is only followed while every move of it is playable,
+        # it takes the place of the hash move as the first move of the node
+        pv_move = self.previous_pv[ply] if self.follow_pv and len(self.previous_pv) > ply else 0
+        self.follow_pv = bool(pv_move) and is_pseudo_legal(board_state, pv_move)
+        first_move = pv_move if self.follow_pv else hash_move
+        ordering = self.ordering
+
+        bound = UPPER_BOUND
+        best_move = 0
+        legal_moves = 0
+        for move in ordering.staged_moves(board_state, ply, first_move):
+            if not make_move(board_state, move):
+                continue
+            legal_moves += 1
+            score = -self.negamax(-beta, -alpha, depth - 1, ply + 1)
+            unmake_move(board_state, move)
+
+            if self.stopped:
+                return 0
+
+            if score > alpha:
+                alpha = score
+                bound = EXACT
+                best_move = move
+                # the best line of this ply is the move followed by the best line of the next one
+                pv_row = self.pv_table[ply]
+                pv_row[ply] = move
+                next_row = self.pv_table[ply + 1]
+                for next_ply in range(ply + 1, self.pv_length[ply + 1]):
+                    pv_row[next_ply] = next_row[next_ply]
+                self.pv_length[ply] = max(self.pv_length[ply + 1], ply + 1)
+
+                if score >= beta:
+                    ordering.update_cutoff(board_state, move, ply, depth, legal_moves)
+                    table.store(board_state.hash_key, move, score_to_table(beta, ply), table_depth, LOWER_BOUND)
+                    return beta
+
+        if not legal_moves:
+            return -MATE_VALUE + ply if in_check else 0
+
+        table.store(board_state.hash_key, best_move, score_to_table(alpha, ply), table_depth, bound)
+        return alpha
+
+    def search(self, board_state, depth=MAX_PLY - 1, nodes=None, movetime=None, on_iteration=print_iteration):
+        """search the position with iterative deepening and return the best move (0 if there is none) and its score
+
+        movetime is in seconds. every finished iteration is stored in self.iterations and passed to on_iteration
+        """
+        self.board_state = board_state
+        self.nodes = 0
+        self.stopped = False
+        self.start_time = time.time()
+        self.deadline = self.start_time + movetime if movetime is not None else None
+        self.node_limit = nodes
+        self.iterations = []
+        self.previous_pv = []
+        self.pv_length[0] = 0
+        self.transposition_table.new_search()
+        self.ordering.new_search()
+
+        best_move, best_score = 0, 0
+        for current_depth in range(1, min(depth, MAX_PLY - 1) + 1):
+            # the previous principal variation is searched first, it makes the next iteration cheap
+            self.follow_pv = True
+            score = self.negamax(-INFINITY, INFINITY, current_depth, 0)
+            if self.stopped:
+                break
+            self.previous_pv = self.principal_variation()
+
+            elapsed = time.time() - self.start_time
+            best_move = self.pv_table[0][0] if self.pv_length[0] else 0
+            best_score = score
+            table = self.transposition_table
+            info = IterationInfo(current_depth, score, self.nodes, elapsed, int(self.nodes / elapsed) if elapsed else 0,
+                                 self.previous_pv, table.hit_rate(), table.cutoff_rate(), table.filled(),
+                                 self.ordering.first_move_cutoff_rate())
+            self.iterations.append(info)
+            if on_iteration is not None:
+                on_iteration(info)
+
+            # a mate was found, searching deeper can not change it
+            if abs(score) > MATE_SCORE:
+                break
+
+        # stopped during the first iteration, fall back on the best root move found so far
+        if not best_move and self.pv_length[0]:
+            best_move = self.pv_table[0][0]
+
+        return best_move, best_score
@@ -1,5 +1,12 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
 from bitboard_utils import *
 from constants import *
+import magic_numbers
 
 
 #################################################
@@ -10,16 +17,18 @@ def mask_pawn_attacks(square: int, color: int):
 	bitboard = set_bit(EMPTY, square)
 
 	if color == white:
-		west_attacks = (bitboard >> np.ulonglong(9)) & ~File.file_H
-		east_attacks = (bitboard >> np.ulonglong(7)) & ~File.file_A
+		west_attacks = (bitboard >> 9) & ~File.file_H
+		east_attacks = (bitboard >> 7) & ~File.file_A
 	else:
-		east_attacks = (bitboard << np.ulonglong(9)) & ~File.file_A
-		west_attacks = (bitboard << np.ulonglong(7)) & ~File.file_H
-	return east_attacks | west_attacks
+		east_attacks = (bitboard << 9) & ~File.file_A
+		west_attacks = (bitboard << 7) & ~File.file_H
+	return (east_attacks | west_attacks) & UNIVERSE
 
 def mask_knight_attacks(square: int):
 	bitboard = EMPTY
 	for bit in [17, -17, 10, -10, 15, -15, 6, -6]:
+		if not 0 <= square + bit < 64:
+			continue
 		bitboard |= set_bit(bitboard, square + bit)
 		if square in (File.A + File.B):
 			bitboard &= ~(File.file_H | File.file_G)
@@ -30,6 +39,8 @@ def mask_knight_attacks(square: int):
 def mask_king_attacks(square: int):
 	bitboard = EMPTY
 	for bit in [1, -1, 7, -7, 8, -8, 9, -9]:
+		if not 0 <= square + bit < 64:
+			continue
 		bitboard = set_bit(bitboard, square + bit)
 
 		if square in File.A:
@@ -39,89 +50,21 @@ def mask_king_attacks(square: int):
 	return bitboard
 
 def mask_bishop_attacks(square: int):
-	attacks = EMPTY
-	tr = square // 8
-	tf = square % 8
-
-	for direction in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
-		for i in range(1, 7):
-			r = tr + direction[0] * i
-			f = tf + direction[1] * i
-			if not 0 < r < 7 or not 0 < f < 7:
-				break
-			attacks |= (np.ulonglong(1) << np.ulonglong(r * 8 + f))
-
-	return attacks
+	return relevant_mask(square, BISHOP_DIRECTIONS)
 
 def mask_rook_attacks(square: int):
-	attacks = EMPTY
-	tr = square // 8
-	tf = square % 8
-
-	for direction in (-1, 1):
-		for i in range(1, 7):
-			r = tr + direction * i
-			if not 0 < r < 7:
-				break
-			attacks |= np.ulonglong(1) << np.ulonglong(r * 8 + tf)
-
-		for i in range(1, 7):
-			f = tf + direction * i
-			if not 0 < f < 7:
-				break
-			attacks |= np.ulonglong(1) << np.ulonglong(tr * 8 + f)
-
-	return attacks
+	return relevant_mask(square, ROOK_DIRECTIONS)
 
 
 #################################################
 # SLIDER PIECES BITBOARD WITH OCCUPANCY 		#
 #################################################
 
-def bishop_attacks_with_occupancy(square: int, occupancy: np.ulonglong):
-	attacks = EMPTY
-	tr = square // 8
-	tf = square % 8
-
-	for direction in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
-		for reach in range(1, 8):
-			r = tr + direction[0] * reach
-			f = tf + direction[1] * reach
-			if not 0 <= r <= 7 or not 0 <= f <= 7:
-				break
-			attacked_bit = BIT << np.ulonglong(r * 8 + f)
-			attacks |= attacked_bit
-			if attacked_bit & occupancy:
-				break
+def bishop_attacks_with_occupancy(square: int, occupancy: int):
+	return ray_attacks(square, occupancy, BISHOP_DIRECTIONS)
 
-	return attacks
-
-
-def rook_attacks_with_occupancy(square: int, occupancy: np.ulonglong):
-	attacks = EMPTY
-	tr = square // 8
-	tf = square % 8
-
-	for direction in (1, -1):
-		for i in range(1, 8):
-			r = tr + direction * i
-			if not 0 <= r <= 7:
-				break
-			attacked_bit = BIT << np.ulonglong(r * 8 + tf)
-			attacks |= attacked_bit
-			if attacked_bit & occupancy:
-				break
-
-		for i in range(1, 8):
-			f = tf + direction * i
-			if not 0 <= f <= 7:
-				break
-			attacked_bit = BIT << np.ulonglong(tr * 8 + f)
-			attacks |= attacked_bit
-			if attacked_bit & occupancy:
-				break
-
-	return attacks
+def rook_attacks_with_occupancy(square: int, occupancy: int):
+	return ray_attacks(square, occupancy, ROOK_DIRECTIONS)
 
 #################################################
 # THE RELEVANT BITS FOR SLIDER PIECES	 		#
@@ -150,51 +93,7 @@ rook_relevant_bits = np.array([
 ], dtype=int)
 
 
-def bishop_attacks_with_occupancy(square: int, block: np.ulonglong):
-	attacks = EMPTY
-	tr = square // 8
-	tf = square % 8
-
-	for direction in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
-		for reach in range(1, 8):
-			r = tr + direction[0] * reach
-			f = tf + direction[1] * reach
-			if not 0 <= r <= 7 or not 0 <= f <= 7:
-				break
-			attacked_bit = np.ulonglong(1) << np.ulonglong(r * 8 + f)
-			attacks |= attacked_bit
-			if attacked_bit & block:
-				break
-
-	return attacks
-
-def rook_attacks_with_occupancy(square: int, block: np.ulonglong):
-	attacks = EMPTY
-	tr = square // 8
-	tf = square % 8
-
-	for direction in (1, -1):
-		for i in range(1, 8):
-			r = tr + direction * i
-			if not 0 <= r <= 7:
-				break
-			attacked_bit = np.ulonglong(1) << np.ulonglong(r * 8 + tf)
-			attacks |= attacked_bit
-			if attacked_bit & block:
-				break
-
-		for i in range(1, 8):
-			f = tf + direction * i
-			if not 0 <= f <= 7:
-				break
-			attacked_bit = np.ulonglong(1) << np.ulonglong(tr * 8 + f)
-			attacks |= attacked_bit
-			if attacked_bit & block:
-				break
-
-	return attacks
-
-def set_occupancy(index: int, bits_in_mask: int, attack_mask: np.ulonglong):
+def set_occupancy(index: int, bits_in_mask: int, attack_mask: int):
 	occupancy = EMPTY
 
 	for count in range(bits_in_mask):
@@ -204,65 +103,39 @@ def set_occupancy(index: int, bits_in_mask: int, attack_mask: np.ulonglong):
 		attack_mask = pop_bit(attack_mask, square)
 
 		if index & (1 << count):
-			occupancy |= np.ulonglong(1) << np.ulonglong(square)
+			occupancy |= BIT << square
 
 	return occupancy
 
-rook_magic_numbers = np.array([0x8a80104000800020,  0x140002000100040,  0x2801880a0017001,
-							   0x100081001000420,   0x200020010080420,  0x3001c0002010008,
-							   0x8480008002000100,  0x2080088004402900, 0x800098204000,
-							   0x2024401000200040,  0x100802000801000,  0x120800800801000,
-							   0x208808088000400,   0x2802200800400,    0x2200800100020080,
-							   0x801000060821100,   0x80044006422000,   0x100808020004000,
-							   0x12108a0010204200,  0x140848010000802,  0x481828014002800,
-							   0x8094004002004100,  0x4010040010010802, 0x20008806104,
-							   0x100400080208000,   0x2040002120081000, 0x21200680100081,
-							   0x20100080080080,    0x2000a00200410,    0x20080800400,
-							   0x80088400100102,    0x80004600042881,   0x4040008040800020,
-							   0x440003000200801,   0x4200011004500,    0x188020010100100,
-							   0x14800401802800,    0x2080040080800200, 0x124080204001001,
-							   0x200046502000484,   0x480400080088020,  0x1000422010034000,
-							   0x30200100110040,    0x100021010009,     0x2002080100110004,
-							   0x202008004008002,   0x20020004010100,   0x2048440040820001,
-							   0x101002200408200,   0x40802000401080,   0x4008142004410100,
-							   0x2060820c0120200,   0x1001004080100,    0x20c020080040080,
-							   0x2935610830022400,  0x44440041009200,   0x280001040802101,
-							   0x2100190040002085,  0x80c0084100102001, 0x4024081001000421,
-							   0x20030a0244872,     0x12001008414402,   0x2006104900a0804,
-							   0x1004081002402], dtype=np.ulonglong)
-
-bishop_magic_numbers = np.array([0x40040844404084,      0x2004208a004208,       0x10190041080202,
-								 0x108060845042010,     0x581104180800210,      0x2112080446200010,
-								 0x1080820820060210,    0x3c0808410220200,      0x4050404440404,
-								 0x21001420088,         0x24d0080801082102,     0x1020a0a020400,
-								 0x40308200402,         0x4011002100800,        0x401484104104005,
-								 0x801010402020200,     0x400210c3880100,       0x404022024108200,
-								 0x810018200204102,     0x4002801a02003,        0x85040820080400,
-								 0x810102c808880400,    0xe900410884800,        0x8002020480840102,
-								 0x220200865090201,     0x2010100a02021202,     0x152048408022401,
-								 0x20080002081110,      0x4001001021004000,     0x800040400a011002,
-								 0xe4004081011002,      0x1c004001012080,       0x8004200962a00220,
-								 0x8422100208500202,    0x2000402200300c08,     0x8646020080080080,
-								 0x80020a0200100808,    0x2010004880111000,     0x623000a080011400,
-								 0x42008c0340209202,    0x209188240001000,      0x400408a884001800,
-								 0x110400a6080400,      0x1840060a44020800,     0x90080104000041,
-								 0x201011000808101,     0x1a2208080504f080,     0x8012020600211212,
-								 0x500861011240000,     0x180806108200800,      0x4000020e01040044,
-								 0x300000261044000a,    0x802241102020002,      0x20906061210001,
-								 0x5a84841004010310,    0x4010801011c04,        0xa010109502200,
-								 0x4a02012000,          0x500201010098b028,     0x8040002811040900,
-								 0x28000010020204,      0x6000020202d0240,      0x8918844842082200,
-								 0x401001102902002], dtype=np.ulonglong)
-
-rook_masks = np.fromiter((mask_rook_attacks(square) for square in range(64)), dtype=np.ulonglong)
-
-bishop_masks = np.fromiter((mask_bishop_attacks(square) for square in range(64)), dtype=np.ulonglong)
-
-def init_sliders(attacks: np.ulonglong, is_bishop: bool):
-	"""initialize bishop and rook attack tables with their magic numbers"""
+# found and verified by magics.py
+rook_magic_numbers = np.array(magic_numbers.rook_magic_numbers, dtype=np.ulonglong)
+bishop_magic_numbers = np.array(magic_numbers.bishop_magic_numbers, dtype=np.ulonglong)
+
+rook_masks = [mask_rook_attacks(square) for square in range(64)]
+
+bishop_masks = [mask_bishop_attacks(square) for square in range(64)]
+
+# python int copies of the magic numbers and shifts for the lookups
+rook_magics = rook_magic_numbers.tolist()
+bishop_magics = bishop_magic_numbers.tolist()
+rook_shifts = (64 - rook_relevant_bits).tolist()
+bishop_shifts = (64 - bishop_relevant_bits).tolist()
+
+def slider_offsets(relevant_bits: np.ndarray):
+	"""start of every square's block in a flat attack table, a block holds 2**relevant_bits entries"""
+	return [0] + np.cumsum(1 << relevant_bits)[:-1].tolist()
+
+# the attack tables of all squares are packed into one flat array per slider, indexed by offset + magic index.
+# this shrinks the numpy tables to 0.86 MB, see slider_lookup_tables for the copies the scalar lookups use
+rook_offsets = slider_offsets(rook_relevant_bits)
+bishop_offsets = slider_offsets(bishop_relevant_bits)
+
+def init_sliders(attacks: np.ndarray, is_bishop: bool):
+	"""initialize a flat bishop or rook attack table with its magic numbers (scalar reference builder)"""
 
 	for sq in range(64):
 		attack_mask = bishop_masks[sq] if is_bishop else rook_masks[sq]
+		offset = bishop_offsets[sq] if is_bishop else rook_offsets[sq]
 
 		relevant_bits_count = count_bits(attack_mask)
 		occupancy_indices = 1 << relevant_bits_count
@@ -270,43 +143,211 @@ def init_sliders(attacks: np.ulonglong, is_bishop: bool):
 		for index in range(occupancy_indices):
 			if is_bishop:  # bishop
 				occupancy = set_occupancy(index, relevant_bits_count, attack_mask)
-				magic_index = (occupancy * bishop_magic_numbers[sq]) >> np.ulonglong(64 - bishop_relevant_bits[sq])
-				attacks[sq][magic_index] = bishop_attacks_with_occupancy(sq, occupancy)
+				magic_index = ((occupancy * bishop_magics[sq]) & UNIVERSE) >> bishop_shifts[sq]
+				attacks[offset + magic_index] = bishop_attacks_with_occupancy(sq, occupancy)
 
 			else:  # rook
 				occupancy = set_occupancy(index, relevant_bits_count, attack_mask)
-				magic_index = int((occupancy * rook_magic_numbers[sq]) >> np.ulonglong(64 - rook_relevant_bits[sq]))
-				attacks[sq][magic_index] = rook_attacks_with_occupancy(sq, occupancy)
+				magic_index = ((occupancy * rook_magics[sq]) & UNIVERSE) >> rook_shifts[sq]
+				attacks[offset + magic_index] = rook_attacks_with_occupancy(sq, occupancy)
+
+	return attacks
+
+#################################################
+# BATCHED SLIDER TABLE BUILDER					#
+#################################################
+
+def mask_occupancies(masks: list, max_bits: int):
+	"""every occupancy subset of each mask in set_occupancy order, shape (64, 2**max_bits)
+
+	returns the occupancies and a flag telling which indices are below 2**bits_in_mask
+	"""
+	masks = np.array(masks, dtype=np.ulonglong)
+	squares = np.arange(64, dtype=np.ulonglong)
+	has_bit = ((masks[:, None] >> squares) & np.ulonglong(1)).astype(bool)
+	bits_in_mask = has_bit.sum(axis=1)
+
+	# squares of the mask bits from least to most significant, 64 pads the unused slots
+	mask_squares = np.sort(np.where(has_bit, np.arange(64), 64), axis=1)[:, :max_bits]
+	mask_bits = np.where(mask_squares < 64, np.ulonglong(1) << np.minimum(mask_squares, 63).astype(np.ulonglong), np.ulonglong(0))
+
+	indices = np.arange(1 << max_bits, dtype=np.ulonglong)
+	occupancies = np.zeros((64, 1 << max_bits), dtype=np.ulonglong)
+	for count in range(max_bits):
+		selected = ((indices >> np.ulonglong(count)) & np.ulonglong(1)).astype(bool)
+		occupancies |= np.where(selected[None, :], mask_bits[:, count, None], np.ulonglong(0))
+
+	valid = indices[None, :] < (np.ulonglong(1) << bits_in_mask.astype(np.ulonglong))[:, None]
+	return occupancies, valid
+
+def ray_attacks_with_occupancies(occupancies: np.ndarray, directions):
+	"""ray walking attacks for every square (row) and occupancy (column) at once"""
+	tr = np.arange(64) // 8
+	tf = np.arange(64) % 8
+	attacks = np.zeros_like(occupancies)
+
+	for dr, df in directions:
+		open_ray = np.ones(occupancies.shape, dtype=bool)
+		for reach in range(1, 8):
+			r = tr + dr * reach
+			f = tf + df * reach
+			on_board = (0 <= r) & (r <= 7) & (0 <= f) & (f <= 7)
+			attacked_bit = np.where(on_board, np.ulonglong(1) << (np.clip(r, 0, 7) * 8 + np.clip(f, 0, 7)).astype(np.ulonglong), np.ulonglong(0))
+			attacks |= np.where(open_ray, attacked_bit[:, None], np.ulonglong(0))
+			open_ray &= (occupancies & attacked_bit[:, None]) == 0
 
 	return attacks
 
+def build_slider_attacks(is_bishop: bool):
+	"""build a whole flat bishop or rook attack table with array operations, same result as init_sliders"""
+	if is_bishop:
+		masks, magic_numbers, relevant_bits, offsets, directions = bishop_masks, bishop_magic_numbers, bishop_relevant_bits, bishop_offsets, BISHOP_DIRECTIONS
+	else:
+		masks, magic_numbers, relevant_bits, offsets, directions = rook_masks, rook_magic_numbers, rook_relevant_bits, rook_offsets, ROOK_DIRECTIONS
+
+	max_bits = int(relevant_bits.max())
+
+	occupancies, valid = mask_occupancies(masks, max_bits)
+	attacks = ray_attacks_with_occupancies(occupancies, directions)
+	magic_indices = (occupancies * magic_numbers[:, None]) >> (64 - relevant_bits).astype(np.ulonglong)[:, None]
+
+	slots = (np.array(offsets)[:, None] + magic_indices.astype(np.int64))[valid]
+	attacks = attacks[valid]
+
+	# colliding magics keep the attacks of the highest occupancy index, like the scalar loop
+	slots, last = np.unique(slots[::-1], return_index=True)
+	table = np.zeros(slider_table_size(is_bishop), dtype=np.ulonglong)
+	table[slots] = attacks[::-1][last]
+	return table
+
+#################################################
+# SLIDER ATTACK TABLE CACHE						#
+#################################################
+
+# the cached tables are memory-mapped, so the numpy arrays of forked workers share their pages.
+# the scalar lookups use them directly with JACE_SHARED_TABLES=1, see slider_lookup_tables
+
+# bump whenever the layout or the contents of the slider tables change
+SLIDER_CACHE_VERSION = 2
+
+SLIDER_CACHE_DIR = os.environ.get(
+	"JACE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".slider_cache"))
+
+def slider_table_size(is_bishop: bool):
+	"""entries of a flat slider table, the sum of 2**relevant_bits over all squares"""
+	return int((1 << (bishop_relevant_bits if is_bishop else rook_relevant_bits)).sum())
+
+def slider_cache_path(is_bishop: bool):
+	"""cache file of a slider table, keyed by a hash of its magic numbers, relevant bits and masks"""
+	if is_bishop:
+		name, tables = "bishop", (bishop_magic_numbers, bishop_relevant_bits, bishop_masks)
+	else:
+		name, tables = "rook", (rook_magic_numbers, rook_relevant_bits, rook_masks)
+
+	digest = hashlib.sha1(str(SLIDER_CACHE_VERSION).encode())
+	for table in tables:
+		digest.update(np.ascontiguousarray(table, dtype=np.ulonglong).tobytes())
+
+	return os.path.join(SLIDER_CACHE_DIR, f"{name}_attacks_v{SLIDER_CACHE_VERSION}_{digest.hexdigest()[:16]}.npy")
+
+def validate_slider_table(attacks: np.ndarray, is_bishop: bool):
+	"""spot check a slider table against the ray walking attacks for an empty and a full mask"""
+	if attacks.shape != (slider_table_size(is_bishop),) or attacks.dtype != np.ulonglong:
+		return False
+
+	masks = bishop_masks if is_bishop else rook_masks
+	magics = bishop_magics if is_bishop else rook_magics
+	shifts = bishop_shifts if is_bishop else rook_shifts
+	offsets = bishop_offsets if is_bishop else rook_offsets
+	attacks_with_occupancy = bishop_attacks_with_occupancy if is_bishop else rook_attacks_with_occupancy
+
+	for sq in range(64):
+		for occupancy in (EMPTY, masks[sq]):
+			magic_index = ((occupancy * magics[sq]) & UNIVERSE) >> shifts[sq]
+			if int(attacks[offsets[sq] + magic_index]) != attacks_with_occupancy(sq, occupancy):
+				return False
+	return True
+
+def load_slider_attacks(is_bishop: bool):
+	"""memory-map a slider table from the disk cache, building and storing it on a miss"""
+	path = slider_cache_path(is_bishop)
+
+	try:
+		attacks = np.asarray(np.load(path, mmap_mode="r"))
+	except (OSError, ValueError):
+		attacks = None
+	if attacks is not None and validate_slider_table(attacks, is_bishop):
+		return attacks
+
+	attacks = build_slider_attacks(is_bishop)
+	if not validate_slider_table(attacks, is_bishop):
+		raise RuntimeError(f"{'bishop' if is_bishop else 'rook'} attack table failed validation, check the magic numbers with magics.py")
+
+	try:
+		os.makedirs(SLIDER_CACHE_DIR, exist_ok=True)
+		# write to a temporary file first so concurrent processes never see a partial table
+		fd, tmp_path = tempfile.mkstemp(dir=SLIDER_CACHE_DIR, suffix=".npy.tmp")
+		with os.fdopen(fd, "wb") as f:
+			np.save(f, attacks)
+		os.chmod(tmp_path, 0o644)
+		os.replace(tmp_path, path)
+	except OSError:
+		# read-only install, keep the freshly built table in memory
+		return attacks
+
+	return np.asarray(np.load(path, mmap_mode="r"))
+
 # sliders
-bishop_attacks = init_sliders(np.empty((64, 512), dtype=np.ulonglong), is_bishop=True)
-rook_attacks = init_sliders(np.empty((64, 4096), dtype=np.ulonglong), is_bishop=False)
+bishop_attacks = load_slider_attacks(is_bishop=True)
+rook_attacks = load_slider_attacks(is_bishop=False)
+
+def slider_lookup_tables(shared: bool):
+	"""the bishop and rook tables the scalar lookups index, both return python ints
+
+	the python int copies are the fast choice, indexing a numpy array costs a scalar object per lookup,
+	but every process holds its own 4.3 MB of them. a memoryview indexes the memory-mapped pages every
+	process shares (0.86 MB) at about 2.5 times the cost per lookup
+	"""
+	if shared:
+		return memoryview(bishop_attacks), memoryview(rook_attacks)
+	return bishop_attacks.tolist(), rook_attacks.tolist()
+
+bishop_table, rook_table = slider_lookup_tables(SHARED_TABLES)
 
 # leapers
-pawn_attacks = np.fromiter((mask_pawn_attacks(sq, color) for color in [white, black] for sq in range(64)), dtype=np.ulonglong)
-pawn_attacks.shape = (2, 64)
-knight_attacks = np.fromiter((mask_knight_attacks(sq) for sq in range(64)), dtype=np.ulonglong)
-king_attacks = np.fromiter((mask_king_attacks(sq) for sq in range(64)), dtype=np.ulonglong)
-
-def get_bishop_attacks(square: int, occupancy: np.ulonglong):
-	if square == 63:
-		return bishop_attacks_with_occupancy(square, occupancy)
-	occupancy &= bishop_masks[square]
-	occupancy *= bishop_magic_numbers[square]
-	occupancy >>= np.ulonglong(64 - bishop_relevant_bits[square])
-	return bishop_attacks[square][occupancy]
-
-def get_rook_attacks(square: int, occupancy: np.ulonglong):
-	occupancy &= rook_masks[square]
-	occupancy *= rook_magic_numbers[square]
-	occupancy >>= np.ulonglong(64 - rook_relevant_bits[square])
-	return rook_attacks[square][occupancy]
-
-def get_queen_attacks(square: int, occupancy: np.ulonglong):
+pawn_attacks = [[mask_pawn_attacks(sq, color) for sq in range(64)] for color in [white, black]]
+knight_attacks = [mask_knight_attacks(sq) for sq in range(64)]
+king_attacks = [mask_king_attacks(sq) for sq in range(64)]
+
+def get_bishop_attacks(square: int, occupancy: int):
+	return bishop_table[bishop_offsets[square] + (((occupancy & bishop_masks[square]) * bishop_magics[square] & UNIVERSE) >> bishop_shifts[square])]
+
+def get_rook_attacks(square: int, occupancy: int):
+	return rook_table[rook_offsets[square] + (((occupancy & rook_masks[square]) * rook_magics[square] & UNIVERSE) >> rook_shifts[square])]
+
+def get_queen_attacks(square: int, occupancy: int):
 	return get_rook_attacks(square, occupancy) | get_bishop_attacks(square, occupancy)
 
+#################################################
+# LINES THROUGH TWO SQUARES						#
+#################################################
+
+def init_lines():
+	"""squares strictly between two aligned squares and the whole line through them, EMPTY if not aligned"""
+	between = [[EMPTY] * 64 for _ in range(64)]
+	lines = [[EMPTY] * 64 for _ in range(64)]
+
+	for a in range(64):
+		for b in range(64):
+			for get_slider_attacks in (get_rook_attacks, get_bishop_attacks):
+				if a != b and get_slider_attacks(a, EMPTY) & (BIT << b):
+					between[a][b] = get_slider_attacks(a, BIT << b) & get_slider_attacks(b, BIT << a)
+					lines[a][b] = get_slider_attacks(a, EMPTY) & get_slider_attacks(b, EMPTY) | (BIT << a) | (BIT << b)
+
+	return between, lines
+
+squares_between, line_through = init_lines()
+
 def get_attacks(piece, start_square, board, color):
     if piece == knight:
         return knight_attacks[start_square] & ~board.occupancy[color]
@@ -322,11 +363,58 @@ def get_attacks(piece, start_square, board, color):
 def is_square_attacked(board_state, square, color):
     """return True if the square is attacked by the given color else False"""
     opponent_color = color ^ 1
-    if pawn_attacks[opponent_color][square] & board_state.pieces_bitboard[color][pawn] \
-            or get_bishop_attacks(square, board_state.occupancy[both]) & board_state.pieces_bitboard[color][bishop] \
-            or knight_attacks[square] & board_state.pieces_bitboard[color][knight] \
-            or get_rook_attacks(square, board_state.occupancy[both]) & board_state.pieces_bitboard[color][rook] \
-            or get_queen_attacks(square, board_state.occupancy[both]) & board_state.pieces_bitboard[color][queen] \
-            or king_attacks[square] & board_state.pieces_bitboard[color][king]:
+    pieces = board_state.pieces_bitboard[color]
+    # queens are looked up together with the bishops and rooks
+    if pawn_attacks[opponent_color][square] & pieces[pawn] \
+            or knight_attacks[square] & pieces[knight] \
+            or get_bishop_attacks(square, board_state.occupancy[both]) & (pieces[bishop] | pieces[queen]) \
+            or get_rook_attacks(square, board_state.occupancy[both]) & (pieces[rook] | pieces[queen]) \
+            or king_attacks[square] & pieces[king]:
         return True
-    return False
\ No newline at end of file
+    return False
+
+def attackers_to(board_state, square, occupancy):
+    """bitboard of the pieces of both colors that attack the square with the given occupancy"""
+    white_pieces = board_state.pieces_bitboard[white]
+    black_pieces = board_state.pieces_bitboard[black]
+    return (
+        pawn_attacks[black][square] & white_pieces[pawn]
+        | pawn_attacks[white][square] & black_pieces[pawn]
+        | knight_attacks[square] & (white_pieces[knight] | black_pieces[knight])
+        | king_attacks[square] & (white_pieces[king] | black_pieces[king])
+        | get_bishop_attacks(square, occupancy) & (white_pieces[bishop] | black_pieces[bishop] | white_pieces[queen] | black_pieces[queen])
+        | get_rook_attacks(square, occupancy) & (white_pieces[rook] | black_pieces[rook] | white_pieces[queen] | black_pieces[queen])
+    )
+
+def attack_map(board_state, color, occupancy=None):
+    """bitboard of every square the given color attacks, with the board occupancy unless another one is passed"""
+    if occupancy is None:
+        occupancy = board_state.occupancy[both]
+    pieces = board_state.pieces_bitboard[color]
+
+    # pawns all at once, dropping the captures that wrap around the board edge
+    pawns = pieces[pawn]
+    if color == white:
+        attacks = (pawns >> 9) & ~File.file_H | (pawns >> 7) & ~File.file_A
+    else:
+        attacks = ((pawns << 7) & ~File.file_H | (pawns << 9) & ~File.file_A) & UNIVERSE
+
+    bitboard = pieces[knight]
+    while bitboard:
+        attacks |= knight_attacks[get_lsb1_index(bitboard)]
+        bitboard &= bitboard - 1
+
+    # queens are looked up together with the bishops and rooks
+    bitboard = pieces[bishop] | pieces[queen]
+    while bitboard:
+        attacks |= get_bishop_attacks(get_lsb1_index(bitboard), occupancy)
+        bitboard &= bitboard - 1
+
+    bitboard = pieces[rook] | pieces[queen]
+    while bitboard:
+        attacks |= get_rook_attacks(get_lsb1_index(bitboard), occupancy)
+        bitboard &= bitboard - 1
+
+    if pieces[king]:
+        attacks |= king_attacks[get_lsb1_index(pieces[king])]
+    return attacks
\ No newline at end of file
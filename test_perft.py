@@ -0,0 +1,63 @@
+import pytest
+
+from board_state import set_fen
+from constants import STARTING_FEN, tricky_position
+from generate_moves import generate_legal_moves, generate_pseudo_legal_moves, play_move, unmake_move
+from perft import perft, perft_hashed, PerftTable
+from tables import is_square_attacked
+from zobrist import generate_hash_key
+
+# positions 3, 4 and 5 of the chessprogramming wiki perft results page
+endgame_position = "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"
+promotion_position = "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1"
+check_position = "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8"
+
+perft_results = [
+    (STARTING_FEN, 4, 197281),
+    (tricky_position, 3, 97862),
+    (endgame_position, 4, 43238),
+    (promotion_position, 3, 9467),
+    (check_position, 3, 62379),
+]
+perft_ids = ["start", "tricky", "endgame", "promotion", "check"]
+
+@pytest.mark.parametrize("fen, depth, nodes", perft_results, ids=perft_ids)
+def test_perft(fen, depth, nodes):
+    board_state = set_fen(fen)
+    snapshot = board_state.snapshot()
+    assert perft(board_state, depth) == nodes
+    assert board_state.snapshot() == snapshot
+
+@pytest.mark.parametrize("fen, depth, nodes", perft_results, ids=perft_ids)
+def test_perft_hashed(fen, depth, nodes):
+    assert perft_hashed(set_fen(fen), depth, PerftTable(1)) == nodes
+
+@pytest.mark.parametrize("fen", [fen for fen, depth, nodes in perft_results], ids=perft_ids)
+def test_play_and_unmake_restore_the_board(fen):
+    """every legal move and every legal reply is played and taken back, the hash key stays in step"""
+    board_state = set_fen(fen)
+    snapshot = board_state.snapshot()
+    for move in generate_legal_moves(board_state):
+        play_move(board_state, move)
+        assert board_state.hash_key == generate_hash_key(board_state)
+        reply_snapshot = board_state.snapshot()
+        for reply in generate_legal_moves(board_state):
+            play_move(board_state, reply)
+            assert board_state.hash_key == generate_hash_key(board_state)
+            unmake_move(board_state, reply)
+            assert board_state.snapshot() == reply_snapshot
+        unmake_move(board_state, move)
+        assert board_state.snapshot() == snapshot
+
+@pytest.mark.parametrize("fen", [fen for fen, depth, nodes in perft_results], ids=perft_ids)
+def test_legal_moves_are_the_legal_pseudo_legal_moves(fen):
+    board_state = set_fen(fen)
+    legal_moves = set(generate_legal_moves(board_state))
+    pseudo_legal_moves = set()
+    for move in generate_pseudo_legal_moves(board_state):
+        play_move(board_state, move)
+        king_square = board_state.king_square[board_state.color ^ 1]
+        if not is_square_attacked(board_state, king_square, board_state.color):
+            pseudo_legal_moves.add(move)
+        unmake_move(board_state, move)
+    assert legal_moves == pseudo_legal_moves
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from tables import init_sliders, build_slider_attacks, slider_table_size, bishop_attacks, rook_attacks
+
+@pytest.mark.parametrize("is_bishop", [True, False], ids=["bishop", "rook"])
+def test_batched_slider_table_matches_scalar_builder(is_bishop):
+    """the batched builder gives the scalar loop's table bit for bit"""
+    scalar = init_sliders(np.zeros(slider_table_size(is_bishop), dtype=np.ulonglong), is_bishop)
+    assert np.array_equal(scalar, build_slider_attacks(is_bishop))
+
+@pytest.mark.parametrize("is_bishop", [True, False], ids=["bishop", "rook"])
+def test_loaded_slider_table_matches_builder(is_bishop):
+    """the table loaded at import (cached or freshly built) is the built one"""
+    loaded = bishop_attacks if is_bishop else rook_attacks
+    assert np.array_equal(loaded, build_slider_attacks(is_bishop))
@@ -0,0 +1,115 @@
+import numpy as np
+
+"""
+           Entry bits                   Meaning
+    bits  0-23                          best move, 0 if the node had none
+    bits 24-40                          score + SCORE_BIAS
+    bits 41-47                          depth
+    bits 48-49                          bound, 0 marks an empty slot
+    bits 50-57                          age of the search that stored it
+"""
+
+# bound of a stored score: exact, at most (no move raised alpha) or at least (beta cutoff)
+EXACT, UPPER_BOUND, LOWER_BOUND = range(1, 4)
+
+SCORE_BIAS = 1 << 16
+AGE_MASK = 0xff
+
+def encode_entry(move, score, depth, bound, age):
+    return move \
+        | (score + SCORE_BIAS) << 24 \
+        | depth << 41 \
+        | bound << 48 \
+        | age << 50
+
+def get_entry_move(entry):
+    return entry & 0xffffff
+
+def get_entry_score(entry):
+    return ((entry >> 24) & 0x1ffff) - SCORE_BIAS
+
+def get_entry_depth(entry):
+    return (entry >> 41) & 0x7f
+
+def get_entry_bound(entry):
+    return (entry >> 48) & 0x3
+
+def get_entry_age(entry):
+    return (entry >> 50) & AGE_MASK
+
+class TranspositionTable:
+    """fixed size hash key -> (best move, score, depth, bound) table for the search
+
+    the table is a power of two number of buckets with two slots each, held in numpy
+    arrays sized from a memory budget. every slot is the full key and one packed entry.
+    the first slot of a bucket keeps the deepest entry unless it was stored by an older
+    search, the second slot always takes the newest one.
+    """
+    # bytes per slot: key and packed entry
+    SLOT_BYTES = 8 + 8
+
+    def __init__(self, hash_mb=16):
+        slots = max(2, int(hash_mb * 1024 * 1024) // self.SLOT_BYTES)
+        buckets = 1 << ((slots // 2).bit_length() - 1)
+        self.mask = buckets - 1
+
+        self.keys = np.zeros(2 * buckets, dtype=np.uint64)
+        self.entries = np.zeros(2 * buckets, dtype=np.uint64)
+        self.age = 0
+
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """age the stored entries, the depth-preferred slots of older searches become replaceable"""
+        self.age = (self.age + 1) & AGE_MASK
+        self.probes = self.hits = self.cutoffs = self.stores = self.overwrites = 0
+
+    def clear(self):
+        self.keys.fill(0)
+        self.entries.fill(0)
+        self.age = 0
+
+    def probe(self, hash_key):
+        """return the packed entry of the position, or 0"""
+        self.probes += 1
+        slot = (hash_key & self.mask) << 1
+        for index in (slot, slot + 1):
+            if self.keys.item(index) == hash_key:
+                entry = self.entries.item(index)
+                if entry:
+                    self.hits += 1
+                    return entry
+        return 0
+
+    def store(self, hash_key, move, score, depth, bound):
+        slot = (hash_key & self.mask) << 1
+        entry = self.entries.item(slot)
+        if not entry or depth >= get_entry_depth(entry) or get_entry_age(entry) != self.age \
+                or self.keys.item(slot) == hash_key:
+            index = slot
+        else:
+            index = slot + 1
+
+        self.stores += 1
+        if self.entries.item(index) and self.keys.item(index) != hash_key:
+            self.overwrites += 1
+
+        self.keys[index] = hash_key
+        self.entries[index] = encode_entry(move, score, depth, bound, self.age)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def cutoff_rate(self):
+        return self.cutoffs / self.probes if self.probes else 0.0
+
+    def filled(self):
+        return np.count_nonzero(self.entries) / len(self.entries)
+
+    def print_stats(self):
+        print(f"probes: {self.probes}  hits: {self.hits} ({self.hit_rate():.1%})  cutoffs: {self.cutoffs} "
+              f"({self.cutoff_rate():.1%})  stores: {self.stores}  overwrites: {self.overwrites}  filled: {self.filled():.1%}")
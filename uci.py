@@ -0,0 +1,234 @@
+"""uci protocol front end of the engine
+
+    python uci.py
+
+commands are read from stdin by a reader thread and the search runs on a worker thread,
+so stop, isready and quit are answered while the engine is thinking. supports uci, isready,
+setoption name Hash, ucinewgame, position (startpos | fen ...) moves ..., go (wtime, btime,
+winc, binc, movestogo, movetime, depth, nodes, infinite), stop and quit
+"""
+import queue
+import sys
+import threading
+
+from board_state import board_state_string, set_fen
+from constants import *
+from generate_moves import generate_legal_moves, make_move
+from move import get_move_uci, moves_to_uci
+from search import Search, MATE_VALUE, MATE_SCORE
+
+ENGINE_NAME = "JustAnotherChessEngine"
+ENGINE_AUTHOR = "Bastian Spatz"
+
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+
+# moves the remaining clock is split over when the gui does not send movestogo
+DEFAULT_MOVES_TO_GO = 30
+# seconds kept back for the gui and the delay between the engine and the clock
+MOVE_OVERHEAD = 0.05
+# no new iteration is started after this share of the allocated time, it would rarely finish
+SOFT_LIMIT_SHARE = 0.5
+
+def allocate_time(time_left, increment=0.0, moves_to_go=None):
+    """seconds to spend on a move with time_left seconds on the clock and increment seconds per move"""
+    moves_to_go = moves_to_go or DEFAULT_MOVES_TO_GO
+    budget = time_left / moves_to_go + increment * 0.75
+    return max(0.01, min(budget, time_left - MOVE_OVERHEAD))
+
+def format_score(score):
+    """uci score of a search score, mate scores as the number of moves to the mate"""
+    if score > MATE_SCORE:
+        return f"mate {(MATE_VALUE - score + 1) // 2}"
+    if score < -MATE_SCORE:
+        return f"mate {-((MATE_VALUE + score) // 2)}"
+    return f"cp {score}"
+
+def parse_go(tokens):
+    """the arguments of a go command as a dict, times in seconds"""
+    limits = {}
+    integer_arguments = {"wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth", "nodes"}
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token in integer_arguments and index + 1 < len(tokens):
+            value = int(tokens[index + 1])
+            limits[token] = value / 1000 if token in ("wtime", "btime", "winc", "binc", "movetime") else value
+            index += 2
+        else:
+            if token == "infinite":
+                limits["infinite"] = True
+            index += 1
+    return limits
+
+class UCIEngine:
+    """state of the uci session: the position, the search and the thread running it"""
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.search = Search(DEFAULT_HASH_MB)
+        self.board_state = set_fen(STARTING_FEN)
+
+        self.search_thread = None
+        # set by stop and quit, an infinite search that ends on its own waits for it before its bestmove
+        self.stop_requested = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def is_searching(self):
+        return self.search_thread is not None and self.search_thread.is_alive()
+
+    def stop_search(self):
+        """stop a running search and wait for its bestmove"""
+        self.stop_requested.set()
+        if self.search_thread is not None:
+            self.search.stop()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def handle(self, line):
+        """run one command line, return False on quit, a malformed command is reported and ignored"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        try:
+            return self.run_command(tokens[0], tokens[1:])
+        except (ValueError, KeyError, IndexError) as error:
+            self.send(f"info string error in {line.strip()!r}: {type(error).__name__} {error}")
+            return True
+
+    def run_command(self, command, arguments):
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(arguments)
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.search.transposition_table.clear()
+            self.board_state = set_fen(STARTING_FEN)
+        elif command == "position":
+            self.stop_search()
+            self.set_position(arguments)
+        elif command == "go":
+            self.stop_search()
+            self.go(parse_go(arguments))
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            self.stop_search()
+            return False
+        elif command == "d":
+            self.send(board_state_string(self.board_state))
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, arguments):
+        # setoption name <name> value <value>
+        if "name" not in arguments or "value" not in arguments:
+            return
+        name = " ".join(arguments[arguments.index("name") + 1:arguments.index("value")])
+        value = " ".join(arguments[arguments.index("value") + 1:])
+        if name.lower() == "hash":
+            self.stop_search()
+            self.search = Search(max(1, min(int(value), MAX_HASH_MB)))
+        else:
+            self.send(f"info string unknown option {name}")
+
+    def set_position(self, arguments):
+        if not arguments:
+            return
+        if "moves" in arguments:
+            moves_index = arguments.index("moves")
+            position, moves = arguments[:moves_index], arguments[moves_index + 1:]
+        else:
+            position, moves = arguments, []
+
+        if position[0] == "startpos":
+            board_state = set_fen(STARTING_FEN)
+        elif position[0] == "fen":
+            board_state = set_fen(" ".join(position[1:]))
+        else:
+            self.send(f"info string unknown position {position[0]}")
+            return
+
+        # every move is looked up among the legal moves, so no input can reach make_move unchecked
+        for uci_move in moves:
+            legal_moves = generate_legal_moves(board_state)
+            move = dict(zip(moves_to_uci(legal_moves).tolist(), legal_moves)).get(uci_move)
+            if move is None:
+                self.send(f"info string illegal move {uci_move}")
+                break
+            make_move(board_state, move)
+        self.board_state = board_state
+
+    def go(self, limits):
+        color_prefix = "w" if self.board_state.color == white else "b"
+        movetime = limits.get("movetime")
+        soft_limit = None
+        if movetime is None and f"{color_prefix}time" in limits:
+            movetime = allocate_time(limits[f"{color_prefix}time"], limits.get(f"{color_prefix}inc", 0.0), limits.get("movestogo"))
+            soft_limit = movetime * SOFT_LIMIT_SHARE
+        elif movetime is not None:
+            movetime = max(0.01, movetime - MOVE_OVERHEAD)
+
+        infinite = limits.get("infinite", False)
+        self.stop_requested.clear()
+        self.search_thread = threading.Thread(
+            target=self.run_search,
+            args=(self.board_state, limits.get("depth", MAX_PLY - 1), limits.get("nodes"), movetime, soft_limit, infinite),
+            daemon=True,
+        )
+        self.search_thread.start()
+
+    def run_search(self, board_state, depth, nodes, movetime, soft_limit, infinite):
+        search = self.search
+
+        def on_iteration(info):
+            self.send(f"info depth {info.depth} score {format_score(info.score)} nodes {info.nodes} nps {info.nps} "
+                      f"time {int(info.time * 1000)} hashfull {int(info.hash_full * 1000)} "
+                      f"pv {' '.join(get_move_uci(move) for move in info.pv)}")
+            self.send(f"info string hash hits {info.hash_hit_rate:.1%} hash cutoffs {info.hash_cutoff_rate:.1%} "
+                      f"first move cutoffs {info.first_move_cutoff_rate:.1%}")
+            # a stop sent before the search started is caught after the first iteration
+            if self.stop_requested.is_set() or (soft_limit is not None and info.time >= soft_limit):
+                search.stop()
+
+        best_move, _ = search.search(board_state, depth=depth, nodes=nodes, movetime=movetime, on_iteration=on_iteration)
+
+        # go infinite only answers once the gui sends stop
+        if infinite:
+            self.stop_requested.wait()
+        self.send(f"bestmove {get_move_uci(best_move) if best_move else '0000'}")
+
+def read_input(lines):
+    """reader thread: put every stdin line on the queue, None at the end of the input"""
+    for line in sys.stdin:
+        lines.put(line)
+    lines.put(None)
+
+def main():
+    engine = UCIEngine()
+    lines = queue.Queue()
+    threading.Thread(target=read_input, args=(lines,), daemon=True).start()
+
+    while True:
+        line = lines.get()
+        if line is None:
+            engine.stop_search()
+            break
+        if not engine.handle(line):
+            break
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
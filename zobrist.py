@@ -0,0 +1,41 @@
+import random
+
+from constants import *
+
+"""
+Zobrist keys: one random 64 bit number per (piece, square), per en passant file,
+per castling rights combination and for black to move. The position key is the
+xor of the keys of everything on the board, so make_move can update it with a
+handful of xors instead of recomputing it.
+"""
+
+# fixed seed, keys (and any hashes stored with them) stay the same between runs
+_random = random.Random(0x4A414345)
+
+# indexed like the mailbox: piece + 6 * color
+piece_keys = [[_random.getrandbits(64) for square in range(64)] for code in range(12)]
+enpassant_keys = [_random.getrandbits(64) for file in range(8)]
+castle_keys = [_random.getrandbits(64) for castle in range(16)]
+side_key = _random.getrandbits(64)
+
+def generate_hash_key(board_state):
+    """compute the zobrist key of a board state from scratch"""
+    hash_key = 0
+
+    for square, code in enumerate(board_state.mailbox):
+        if code != NO_PIECE:
+            hash_key ^= piece_keys[code][square]
+
+    if board_state.en_passant_square != no_sq:
+        hash_key ^= enpassant_keys[board_state.en_passant_square % 8]
+
+    hash_key ^= castle_keys[board_state.castle]
+
+    if board_state.color == black:
+        hash_key ^= side_key
+
+    return hash_key
+
+def hash_key_matches(board_state):
+    """debug check of the incrementally updated key against a full recomputation"""
+    return board_state.hash_key == generate_hash_key(board_state)